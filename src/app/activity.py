@@ -0,0 +1,126 @@
+import calendar
+import numpy as np
+import pandas as pd
+import chat_stats
+
+
+# Cells per (user, year): 12 months × 7 weekdays × 24 hours
+CELLS = 12 * 7 * 24
+
+
+class ActivityCube:
+    """
+    Messages per user × year × month × weekday × hour as one dense int32 array.
+
+    counts[u, y, m, w, h] counts the lines of users[u] sent in year first_year + y,
+    month m + 1, weekday w (0 = Monday) and hour h. Every temporal chart is a sum
+    over some of these axes; "Overall" is the sum over every user but the
+    group notifications, i.e. the user messages.
+    """
+
+    def __init__(self, users, first_year, counts):
+        self.users = users
+        self.first_year = first_year
+        self.counts = counts
+        self.rows = {user: i for i, user in enumerate(users)}
+
+    @classmethod
+    def from_frame(cls, df):
+        codes, users = pd.factorize(df['user'].astype(str).values)
+        users = list(users)
+
+        if len(df) == 0:
+            return cls(users, 0, np.zeros((len(users), 0, 12, 7, 24), np.int32))
+
+        years = df['year'].values.astype(np.int64)
+        first_year = int(years.min())
+        n_years = int(years.max()) - first_year + 1
+
+        # One flat cell index per line, counted in a single bincount
+        cell = codes.astype(np.int64) * n_years + (years - first_year)
+        cell = cell * 12 + (df['month'].values.astype(np.int64) - 1)
+        cell = cell * 7 + df['weekday'].values.astype(np.int64)
+        cell = cell * 24 + df['hour'].values.astype(np.int64)
+
+        counts = np.bincount(cell, minlength=len(users) * n_years * CELLS).astype(np.int32)
+
+        return cls(users, first_year, counts.reshape(len(users), n_years, 12, 7, 24))
+
+    def user(self, selected_user="Overall"):
+        """ The year × month × weekday × hour counts of one user or "Overall" """
+
+        if selected_user == "Overall":
+            people = [i for user, i in self.rows.items() if user != chat_stats.NOTIFICATION_USER]
+            return self.counts[people].sum(axis=0)
+
+        if selected_user not in self.rows:
+            return np.zeros(self.counts.shape[1:], np.int32)
+
+        return self.counts[self.rows[selected_user]]
+
+    def years(self):
+        return np.arange(self.first_year, self.first_year + self.counts.shape[1])
+
+    def per_year(self, selected_user="Overall"):
+        """ Messages per year, only the years with messages """
+
+        totals = pd.Series(self.user(selected_user).sum(axis=(1, 2, 3)), index=self.years())
+        return totals[totals > 0]
+
+    def per_month(self, selected_user="Overall"):
+        """ Messages per calendar month (index 1-12) over all years """
+
+        return pd.Series(self.user(selected_user).sum(axis=(0, 2, 3)), index=range(1, 13))
+
+    def per_weekday(self, selected_user="Overall"):
+        """ Messages per weekday (index 0 = Monday) """
+
+        return pd.Series(self.user(selected_user).sum(axis=(0, 1, 3)), index=range(7))
+
+    def per_hour(self, selected_user="Overall"):
+        return pd.Series(self.user(selected_user).sum(axis=(0, 1, 2)), index=range(24))
+
+    def weekday_hour(self, selected_user="Overall"):
+        """ 7 × 24 matrix of messages per weekday and hour """
+
+        return self.user(selected_user).sum(axis=(0, 1))
+
+    def year_month(self, selected_user="Overall"):
+        """ Years × 12 matrix of messages per month """
+
+        return self.user(selected_user).sum(axis=(2, 3))
+
+    def avg_per_month(self, selected_user="Overall"):
+        """ Mean messages of each calendar month over the (year, month) cells with any message """
+
+        months = self.year_month(selected_user)
+        active = (months > 0).sum(axis=0)
+
+        return pd.Series(np.where(active > 0, months.sum(axis=0) / np.maximum(active, 1), np.nan), index=range(1, 13))
+
+    def weekday_occurrences(self, selected_user="Overall"):
+        """
+        How many of each weekday the months the user was active in hold; the cube has
+        no day axis, so activity is measured in whole months
+        """
+
+        occurrences = np.zeros(7, np.int64)
+
+        for index in np.flatnonzero(self.year_month(selected_user).ravel()):
+            first_weekday, days = calendar.monthrange(self.first_year + index // 12, index % 12 + 1)
+            occurrences += np.roll(np.bincount(np.arange(days) % 7, minlength=7), first_weekday)
+
+        return occurrences
+
+    def avg_per_weekday(self, selected_user="Overall"):
+        """ Messages per weekday divided by how many of that weekday the active months hold """
+
+        occurrences = self.weekday_occurrences(selected_user)
+
+        return pd.Series(self.per_weekday(selected_user).values / np.maximum(occurrences, 1), index=range(7))
+
+
+def activity_for(df):
+    """ ActivityCube of a parsed chat, built once per chat and reduced by every temporal chart """
+
+    return chat_stats.derived(df, 'activity', ActivityCube.from_frame)
@@ -17,8 +17,12 @@ def run():
 
             if (selected_user == "Overall"):
                 utils.setGap()
-                timeline = utils.draw.plot_chat_timeline(df)
-                utils.st.pyplot(timeline)
+                if utils.interactive.enabled():
+                    utils.interactive.show(utils.interactive.timeline_chart(df))
+                else:
+                    rolling = st.toggle("Rolling average")
+                    timeline = utils.memo.chart(utils.draw.plot_chat_timeline, df, rolling=rolling)
+                    utils.render.show(timeline)
                 utils.setGap()
                 utils.setGap()
          
@@ -32,6 +36,9 @@ def run():
             utils.wordCloud(df, selected_user)
             utils.setGap()
 
+    # Sampled last, so the peak covers everything this run drew
+    utils.render.debug_panel()
+
 
 if __name__ == '__main__':
     run()
\ No newline at end of file
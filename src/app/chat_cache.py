@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import tempfile
+import pandas as pd
+import streamlit as st
+import chat_stats
+import preprocessor
+
+
+# Parsed chats are kept as Parquet files named after the hash of the uploaded bytes
+CACHE_DIR = os.environ.get("WHATSINSIGHT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "whatsinsight"))
+
+# Process-pool workers for parsing uploads too large to parse quickly in one process (see
+# preprocessor.PARALLEL_THRESHOLD); 1 keeps parsing serial, 0 uses every core
+PARSE_WORKERS = int(os.environ.get("WHATSINSIGHT_PARSE_WORKERS", "1")) or None
+
+# Total size of the cache directory, least recently used chats are evicted beyond it
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump whenever preprocess or ChatStats change their output, older cache files are then ignored
+SCHEMA_VERSION = 5
+
+# Leading bytes hashed to find an earlier export of the same chat, a handful of messages
+HEAD_BYTES = 64 * 1024
+
+
+def content_hash(upload, length=None):
+    """ Hex digest identifying an upload by its bytes, or by its first length bytes; read in chunks """
+
+    digest = hashlib.sha256()
+    upload.seek(0)
+    remaining = length
+
+    while remaining is None or remaining > 0:
+        chunk = upload.read(preprocessor.CHUNK_SIZE if remaining is None else min(remaining, preprocessor.CHUNK_SIZE))
+        if not chunk:
+            break
+        digest.update(chunk)
+        if remaining is not None:
+            remaining -= len(chunk)
+
+    return digest.hexdigest()
+
+
+def upload_size(upload):
+    return upload.seek(0, os.SEEK_END)
+
+
+def cache_path(digest, kind="parquet"):
+    return os.path.join(CACHE_DIR, f"{digest}-v{SCHEMA_VERSION}.{kind}")
+
+
+def head_hash(upload, length):
+    """ Hex digest of the leading messages of an export, the first HEAD_BYTES of its first length bytes """
+
+    upload.seek(0)
+    return hashlib.sha256(upload.read(min(length, HEAD_BYTES))).hexdigest()
+
+
+def load(digest):
+    """ Cached frame for a digest, or None """
+
+    path = cache_path(digest)
+
+    try:
+        df = pd.read_parquet(path)
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+
+    # Mark as recently used for eviction
+    os.utime(path)
+    chat_stats.set_fingerprint(df, digest)
+
+    return df
+
+
+def load_stats(digest):
+    """ Cached ChatStats for a digest, or None """
+
+    try:
+        with open(cache_path(digest, "stats.json")) as f:
+            return chat_stats.ChatStats.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_atomic(path, write):
+    """ write(tmp_path) to a temporary file first so readers never see a half-written file """
+
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def write_json(value, path):
+    with open(path, "w") as f:
+        json.dump(value, f)
+
+
+def store(digest, df, stats=None, upload=None):
+    """
+    Write a parsed frame to the cache, then trim the cache to its size limit.
+    With the uploaded file, a manifest lets later exports of the same chat find it as their prefix;
+    it also keeps the date order the export was read with.
+    """
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    write_atomic(cache_path(digest), lambda path: df.to_parquet(path, index=False))
+
+    if stats is not None:
+        write_atomic(cache_path(digest, "stats.json"), lambda path: write_json(stats.to_dict(), path))
+
+    if upload is not None:
+        size = upload_size(upload)
+        manifest = {"length": size, "head": head_hash(upload, size), "dayfirst": df.attrs.get('dayfirst')}
+        write_atomic(cache_path(digest, "json"), lambda path: write_json(manifest, path))
+
+    evict()
+
+
+def evict(max_bytes=CACHE_MAX_BYTES):
+    """ Delete the files of least recently used chats until the directory fits in max_bytes """
+
+    chats = {}
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".tmp"):
+            continue
+        # Another session may have evicted or replaced it since the listing
+        try:
+            stat = os.stat(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            continue
+        digest = name.split("-v")[0]
+        mtime, size, names = chats.get(digest, (0, 0, []))
+        chats[digest] = (max(mtime, stat.st_mtime), size + stat.st_size, names + [name])
+
+    total = sum(size for _, size, _ in chats.values())
+
+    for _, size, names in sorted(chats.values()):
+        if total <= max_bytes:
+            break
+        for name in names:
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def find_prefix(upload):
+    """ (digest, manifest) of a cached export whose bytes start the upload, or None """
+
+    try:
+        names = os.listdir(CACHE_DIR)
+    except FileNotFoundError:
+        return None
+
+    size = upload_size(upload)
+    suffix = f"-v{SCHEMA_VERSION}.json"
+    candidates = []
+    for name in names:
+        if not name.endswith(suffix):
+            continue
+        try:
+            with open(os.path.join(CACHE_DIR, name)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        # The leading messages are compared first, the full prefix hash only for matching chats
+        length = manifest["length"]
+        if length < size and manifest["head"] == head_hash(upload, length):
+            candidates.append((length, name[:-len(suffix)], manifest))
+
+    # The longest earlier export leaves the least to parse
+    for length, digest, manifest in sorted(candidates, key=lambda candidate: candidate[0], reverse=True):
+        if content_hash(upload, length) == digest:
+            return digest, manifest
+
+    return None
+
+
+def extend_cached(upload):
+    """
+    Frame and ChatStats of an export that continues a cached one, parsing only the new tail.
+    (None, None) when no cached export is a prefix or the tail does not start at a message.
+    """
+
+    match = find_prefix(upload)
+    if match is None:
+        return None, None
+
+    digest, manifest = match
+    length = manifest["length"]
+    head_df = load(digest)
+    if head_df is None:
+        return None, None
+
+    # The earlier export may end without a newline, the new one then continues with it
+    upload.seek(length - 1)
+    if upload.read(1) != b"\n":
+        if upload.read(1) != b"\n":
+            return None, None
+        length += 1
+
+    # The tail must be read exactly like the head, including a date order its few dates cannot settle
+    upload.seek(0)
+    dialect = preprocessor.sniff_format(upload.read(HEAD_BYTES).decode("utf-8", errors="ignore"))
+    if dialect is None or manifest.get("dayfirst") is None:
+        return None, None
+    dialect = dialect._replace(dayfirst=manifest["dayfirst"])
+
+    upload.seek(length)
+    if not preprocessor.header_pattern(dialect).match(upload.read(HEAD_BYTES).decode("utf-8", errors="ignore")):
+        return None, None
+
+    upload.seek(length)
+    try:
+        tail_df = preprocessor.preprocess_stream(upload, dialect=dialect, workers=PARSE_WORKERS)
+    except UnicodeDecodeError:
+        return None, None
+
+    head_stats = chat_stats.recall(head_df, 'stats') or load_stats(digest) or chat_stats.stats_for(head_df)
+    stats = head_stats.merge(chat_stats.ChatStats.from_frame(tail_df))
+
+    df = preprocessor.append_messages(head_df, tail_df)
+    df.attrs['dayfirst'] = dialect.dayfirst
+
+    return df, stats
+
+
+def load_or_parse(uploaded_file):
+    """
+    Parsed frame for an uploaded export, read from the cache when the same bytes were seen before.
+    A newer export of a cached chat only has its new messages parsed and their stats merged.
+    """
+
+    # The upload is hashed and parsed straight from the file, never copied whole
+    digest = content_hash(uploaded_file)
+
+    df = load(digest)
+    if df is not None:
+        stats = chat_stats.recall(df, 'stats') or load_stats(digest)
+        if stats is not None:
+            chat_stats.remember(df, 'stats', stats)
+        return df
+
+    df, stats = extend_cached(uploaded_file)
+
+    if df is None:
+        uploaded_file.seek(0)
+        df = preprocessor.preprocess_stream(uploaded_file, workers=PARSE_WORKERS)
+
+    chat_stats.set_fingerprint(df, digest)
+
+    if stats is None:
+        stats = chat_stats.stats_for(df)
+    else:
+        chat_stats.remember(df, 'stats', stats)
+
+    try:
+        store(digest, df, stats, uploaded_file)
+    except OSError as e:
+        # A read-only or full disk only costs the speedup
+        st.sidebar.warning(f"Could not cache parsed chat, it will be parsed again next time: {e}")
+
+    return df
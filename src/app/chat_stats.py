@@ -0,0 +1,231 @@
+import threading
+from collections import Counter, OrderedDict
+import emoji_stats
+import pandas as pd
+import preprocessor
+import tokens
+
+
+NOTIFICATION_USER = "group_notification"
+
+# Chats whose aggregates and other derived data are kept in memory, least recently used are dropped first
+MAX_CHATS = 8
+
+registry = OrderedDict()
+registry_lock = threading.Lock()
+
+
+def fingerprint(df):
+    """ Identifier of a parsed chat, the upload digest when it came through chat_cache """
+
+    chat_id = df.attrs.get('fingerprint')
+
+    # pandas copies attrs onto filtered frames; one with fewer rows than the frame the
+    # identifier was set on is a different frame and is hashed on its own
+    if chat_id is None or df.attrs.get('fingerprint_rows') != len(df):
+        chat_id = str(pd.util.hash_pandas_object(df[['user', 'message', 'timestamp']], index=False).sum())
+        set_fingerprint(df, chat_id)
+
+    return chat_id
+
+
+def set_fingerprint(df, chat_id):
+    """ Mark df as the chat identified by chat_id """
+
+    df.attrs['fingerprint'] = chat_id
+    df.attrs['fingerprint_rows'] = len(df)
+
+
+class ChatStats:
+    """
+    Per-user aggregates of a parsed chat, computed in one groupby pass.
+
+    table has one row per user (plus "Overall") with messages, words, max_words,
+    unique_words, links, media and the image/video/audio/document/contact flag
+    counts set while parsing. vocabulary and emojis keep the word sets and
+    emoji Counters behind unique_words and emojis_used, and daily counts user
+    messages per day, so that stats of two parts of a chat can be merged.
+    """
+
+    COLUMNS = ['messages', 'words', 'max_words', 'unique_words', 'links', 'media']
+    CONTENT_COLUMNS = ['image', 'video', 'audio', 'document', 'contact']
+
+    def __init__(self, table, vocabulary, emojis, daily):
+        self.table = table
+        self.vocabulary = vocabulary
+        self.emojis = emojis
+        self.daily = daily
+
+    @classmethod
+    def from_frame(cls, df, index=None):
+        messages = df['message'].astype(str)
+
+        # Word counts and vocabularies come from the chat's token index, the text is not rescanned
+        if index is None:
+            index = tokens.TokenIndex.from_messages(messages)
+        words = index.counts
+        media = df['content_kind'].isin(preprocessor.MEDIA_KINDS)
+
+        per_message = pd.DataFrame({'words': words, 'links': df['link'], 'media': media})
+        per_message[cls.CONTENT_COLUMNS] = df[cls.CONTENT_COLUMNS]
+        grouped = per_message.groupby(df['user'].astype(str).values)
+
+        table = pd.DataFrame({
+            'messages': grouped.size(),
+            'words': grouped['words'].sum(),
+            'max_words': grouped['words'].max(),
+            'links': grouped['links'].sum(),
+            'media': grouped['media'].sum(),
+        })
+        table[cls.CONTENT_COLUMNS] = grouped[cls.CONTENT_COLUMNS].sum()
+
+        codes, users = pd.factorize(df['user'].astype(str).values)
+        user_codes, word_ids, strings = index.user_words(codes)
+        vocabulary = {user: set() for user in users}
+        for code, user_words in pd.Series(strings[word_ids], dtype=object).groupby(user_codes):
+            vocabulary[users[code]] = set(user_words)
+
+        emojis = emoji_stats.user_emoji_counts(messages, df['user'].astype(str).values)
+        emojis = {user: emojis.get(user, Counter()) for user in table.index}
+
+        table['unique_words'] = pd.Series({user: len(words) for user, words in vocabulary.items()})
+
+        stamps = df.loc[df['event_type'] == 'message', 'timestamp']
+        daily = stamps.dt.normalize().value_counts().sort_index()
+
+        stats = cls(table[cls.COLUMNS + cls.CONTENT_COLUMNS], vocabulary, emojis, daily)
+        stats.derive_overall()
+
+        return stats
+
+    def derive_overall(self):
+        """ Rebuild the "Overall" row from the per-user rows """
+
+        table = self.table.drop(index="Overall", errors='ignore')
+        people = table.drop(index=NOTIFICATION_USER, errors='ignore')
+        users = list(people.index)
+
+        self.vocabulary["Overall"] = set().union(*(self.vocabulary[user] for user in users))
+        self.emojis["Overall"] = sum((self.emojis[user] for user in users), Counter())
+
+        # Media and content kinds count every line, as the media helpers always did;
+        # the rest counts user messages only
+        overall = people.sum()
+        overall['max_words'] = people['max_words'].max() if len(people) else 0
+        overall[['media'] + self.CONTENT_COLUMNS] = table[['media'] + self.CONTENT_COLUMNS].sum()
+        overall['unique_words'] = len(self.vocabulary["Overall"])
+
+        table.loc["Overall"] = overall
+        self.table = table.astype('int64')
+
+    def to_dict(self):
+        """ The stats as plain lists and dicts, for JSON """
+
+        return {
+            'table': {'index': list(self.table.index), 'columns': list(self.table.columns),
+                      'data': self.table.to_numpy().tolist()},
+            'vocabulary': {user: sorted(words) for user, words in self.vocabulary.items()},
+            'emojis': {user: dict(counts) for user, counts in self.emojis.items()},
+            'daily': {'index': self.daily.index.strftime('%Y-%m-%d').tolist(), 'data': self.daily.tolist()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        table = pd.DataFrame(data['table']['data'], index=pd.Index(data['table']['index'], dtype=object),
+                             columns=data['table']['columns'], dtype='int64')
+        daily = pd.Series(data['daily']['data'], dtype='int64', name='count',
+                          index=pd.DatetimeIndex(pd.to_datetime(data['daily']['index']), name='timestamp'))
+
+        return cls(
+            table,
+            {user: set(words) for user, words in data['vocabulary'].items()},
+            {user: Counter(counts) for user, counts in data['emojis'].items()},
+            daily,
+        )
+
+    def merge(self, other):
+        """ Stats of this chat followed by other, e.g. the messages added since an earlier export """
+
+        table = self.table.drop(index="Overall").add(other.table.drop(index="Overall"), fill_value=0)
+        table['max_words'] = pd.concat([self.table['max_words'], other.table['max_words']]).groupby(level=0).max()
+
+        vocabulary, emojis = {}, {}
+        for user in table.index:
+            vocabulary[user] = self.vocabulary.get(user, set()) | other.vocabulary.get(user, set())
+            emojis[user] = self.emojis.get(user, Counter()) + other.emojis.get(user, Counter())
+        table['unique_words'] = pd.Series({user: len(words) for user, words in vocabulary.items()})
+
+        daily = self.daily.add(other.daily, fill_value=0).astype('int64')
+
+        merged = ChatStats(table, vocabulary, emojis, daily)
+        merged.derive_overall()
+
+        return merged
+
+    def row(self, user):
+        """ Aggregates of one user or "Overall", zeros for a user with no messages """
+
+        if user in self.table.index:
+            return self.table.loc[user]
+
+        return pd.Series(0, index=self.COLUMNS + self.CONTENT_COLUMNS, dtype='int64')
+
+    def value(self, user, column):
+        return self.row(user)[column]
+
+    def per_user(self, column):
+        """ One column for every participant, without the "Overall" and notification rows """
+
+        return self.table[column].drop(index=["Overall", NOTIFICATION_USER], errors='ignore')
+
+    def emoji_counts(self, user):
+        return self.emojis.get(user, Counter())
+
+
+def derived(df, name, build):
+    """ build(df) computed once per chat and kept with the chat's other derived data """
+
+    key = (fingerprint(df), len(df))
+
+    with registry_lock:
+        entry = registry.get(key)
+        if entry is not None:
+            registry.move_to_end(key)
+            if name in entry:
+                return entry[name]
+
+    value = build(df)
+    remember(df, name, value)
+
+    return value
+
+
+def remember(df, name, value):
+    """ Register data derived elsewhere (loaded from disk or merged) for a chat """
+
+    key = (fingerprint(df), len(df))
+
+    with registry_lock:
+        registry.setdefault(key, {})[name] = value
+        registry.move_to_end(key)
+        while len(registry) > MAX_CHATS:
+            registry.popitem(last=False)
+
+
+def recall(df, name):
+    """ Derived data already registered for a chat, or None """
+
+    with registry_lock:
+        return registry.get((fingerprint(df), len(df)), {}).get(name)
+
+
+def stats_for(df):
+    """ ChatStats of a parsed chat, built on first use and shared by every helper call """
+
+    return derived(df, 'stats', lambda df: ChatStats.from_frame(df, tokens_for(df)))
+
+
+def tokens_for(df):
+    """ TokenIndex of a parsed chat's messages, tokenized once and shared by stats and the word cloud """
+
+    return derived(df, 'tokens', lambda df: tokens.TokenIndex.from_messages(df['message']))
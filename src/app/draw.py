@@ -3,50 +3,45 @@ import matplotlib.dates as mdates
 import numpy as np
 import seaborn as sns
 import pandas as pd
-from datetime import datetime
+import calendar
+import activity
+import chat_stats
 import helper
 import utils
+from render import STREAMLIT_BG
 
-# Streamlit dark theme background
-STREAMLIT_BG = '#0E1117'
 
-
-def plot_chat_timeline(df):
-    current_date = datetime.now().date()
-
-    df = df[df['user'] != 'group_notification'].copy()
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
-    df = df[df['date'].dt.date <= current_date]
-
-    daily_counts = df.groupby('date').size()
-
-    # daily_counts = {'07-10-2023': 100, '08-10-2020':50 ,,,.. "current-date":300}
+def plot_chat_timeline(df, rolling=False):
+    # Day, week or month resolution from the chat's span, so the plot stays a few hundred points at most
+    counts, resolution = helper.timeline_counts(df)
+    unit = {'D': "Day", 'W-MON': "Week", 'MS': "Month"}[resolution]
 
     fig, ax = plt.subplots(figsize=(12, 5))
-    fig.patch.set_facecolor('none')
-    ax.set_facecolor(STREAMLIT_BG)
 
     # Line plot
-    ax.plot(daily_counts.index, daily_counts.values, color="#79f245", linewidth=1.3)
+    ax.plot(counts.index, counts.values, color="#79f245", linewidth=1.3, alpha=0.45 if rolling else 1)
+
+    if rolling:
+        window = helper.ROLLING_WINDOWS[resolution]
+        average = counts.rolling(window, min_periods=1, center=True).mean()
+        ax.plot(average.index, average.values, color="#79f245", linewidth=2.2,
+                label=f"{window}-{unit.lower()} average")
+        legend = ax.legend(frameon=False)
+        for text in legend.get_texts():
+            text.set_color("white")
 
     # Title & labels
     ax.set_title("Chat Timeline", fontsize=22, fontweight='bold', color='white', pad=20)
     ax.set_xlabel("", fontsize=12)
-    ax.set_ylabel("Messages", fontsize=14, color='white')
+    ax.set_ylabel(f"Messages per {unit.lower()}", fontsize=14, color='white')
 
-    # X-axis formatting (month + year)
-    ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+    # About a dozen ticks whatever the span, labelled by month and year
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=4, maxticks=12))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%d %b %Y' if resolution == 'D' else '%b %Y'))
     ax.tick_params(axis='x', rotation=45, colors='white')
     ax.tick_params(axis='y', colors='white')
 
-    # Clean look
-    ax.spines['top'].set_color(STREAMLIT_BG)
-    ax.spines['right'].set_color(STREAMLIT_BG)   
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white') 
-
-    plt.tight_layout()
+    fig.tight_layout()
 
     return fig
 
@@ -62,18 +57,15 @@ def distribution_chart(df, metric):
         user_counts = df['user'].value_counts().to_dict()
 
     elif metric == 'media':
-        user_counts = {}
-        for user in df['user'].unique():
-            if pd.isna(user):
-                continue
-            user_counts[user] = helper.media_shared(user, df)
+        user_counts = helper.media_counts(df).to_dict()
 
     elif metric == 'links':
-        user_counts = df[df['message'].str.contains(r'https?://', na=False)]['user'].value_counts().to_dict()
+        user_counts = df.loc[df['link'], 'user'].value_counts().to_dict()
 
+    # Categorical users are counted even when absent from the selection, drop those zeros
     user_counts = {
         user: count for user, count in user_counts.items()
-        if user.lower() != 'group_notification' and user.lower() != 'meta ai'
+        if count > 0 and user.lower() != 'group_notification' and user.lower() != 'meta ai'
     }
 
     if not user_counts:
@@ -166,9 +158,10 @@ def distribution_chart(df, metric):
 
 
 def top_active_users_plot(df):
-    df = df[df['user'].str.lower() != 'group_notification']
+    df = df[df['event_type'] == 'message']
 
     user_counts = df['user'].value_counts()
+    user_counts = user_counts[user_counts > 0]
     top_users = user_counts.head(min(5, len(user_counts)))
 
     user_color_map = utils.get_user_colors(user_counts)
@@ -177,15 +170,6 @@ def top_active_users_plot(df):
 
     fig, ax = plt.subplots(figsize=(9, 9.4))
 
-    fig.patch.set_facecolor('none')         
-    fig.patch.set_edgecolor('none')        
-
-    ax.set_facecolor(STREAMLIT_BG)          
-    ax.spines['top'].set_color(STREAMLIT_BG)
-    ax.spines['right'].set_color(STREAMLIT_BG)   
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white')        
-
     # Plot bars
     bars = ax.bar(top_users.index, top_users.values, color=colors)
 
@@ -211,26 +195,18 @@ def top_active_users_plot(df):
             fontweight='bold'
         )
 
-    fig.patch.set_edgecolor('none')
-
     return fig
 
 
 
 def plot_media_categorization(df, selected_user):
-    df = df.copy()
-    df = df[df['user'].str.lower() != 'group_notification']
-
-    if selected_user != "Overall":
-        user_df = df[df['user'] == selected_user]
-    else:
-        user_df = df
+    row = chat_stats.stats_for(df).row(selected_user)
 
-    # Count media types
+    # Count media types from the flags set while parsing
     media_counts = {
-        "Image": user_df['message'].str.contains(r'\.(jpg|jpeg|png|gif|webp)', case=False, na=False).sum(),
-        "Video": user_df['message'].str.contains(r'\.(mp4|3gp|mkv|mov)', case=False, na=False).sum(),
-        "Audio": user_df['message'].str.contains(r'\.(opus|mp3|m4a|aac)', case=False, na=False).sum()
+        "Image": row['image'],
+        "Video": row['video'],
+        "Audio": row['audio']
     }
 
     total = sum(media_counts.values())
@@ -258,15 +234,6 @@ def plot_media_categorization(df, selected_user):
 
     fig, ax = plt.subplots(figsize=(9, 9.4))
 
-    fig.patch.set_facecolor('none')
-    fig.patch.set_edgecolor('none')
-
-    ax.set_facecolor(STREAMLIT_BG)
-    ax.spines['top'].set_color(STREAMLIT_BG)
-    ax.spines['right'].set_color(STREAMLIT_BG)
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white')
-
     bars = ax.bar(media_labels, media_values, color=colors)
 
     ax.tick_params(axis='x', colors='white', labelsize=15)
@@ -289,28 +256,15 @@ def plot_media_categorization(df, selected_user):
             fontweight='bold'
         )
 
-    fig.patch.set_edgecolor('none')
-
     return fig
 
 
 
-def yearly_message_count_plot(df):
-    year_counts = df['year'].value_counts().sort_index()
+def yearly_message_count_plot(df, selected_user="Overall"):
+    year_counts = activity.activity_for(df).per_year(selected_user)
 
     fig, ax = plt.subplots(figsize=(9, 9.4))
 
-    # Match background
-    fig.patch.set_facecolor('none')
-    fig.patch.set_edgecolor('none')
-    ax.set_facecolor(STREAMLIT_BG)
-
-    # Match spines
-    ax.spines['top'].set_color(STREAMLIT_BG)
-    ax.spines['right'].set_color(STREAMLIT_BG)
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white')
-
     # Plot line
     ax.plot(year_counts.index, year_counts.values, marker='o', color='skyblue', linewidth=2)
 
@@ -332,33 +286,15 @@ def yearly_message_count_plot(df):
 
 
 
-def monthly_message_count_plot(df):
-    # Extract month
-    df['month'] = pd.to_datetime(df['date']).dt.strftime('%B')
-
-    # Month order 
-    month_order = ["January", "February", "March", "April", "May", "June",
-                "July", "August", "September", "October", "November", "December"]
-
-    # Count messages per month
-    month_counts = df['month'].value_counts().reindex(month_order, fill_value=0)
+def monthly_message_count_plot(df, selected_user="Overall"):
+    # Count messages per month (1 = January)
+    month_counts = activity.activity_for(df).per_month(selected_user)
 
     # Create short month names for display
-    short_months = [month[:3] for month in month_order]
+    short_months = list(calendar.month_abbr)[1:]
 
     fig, ax = plt.subplots(figsize=(9, 9.4))
 
-    # Match background
-    fig.patch.set_facecolor('none')
-    fig.patch.set_edgecolor('none')
-    ax.set_facecolor(STREAMLIT_BG)
-
-    # Match spines
-    ax.spines['top'].set_color(STREAMLIT_BG)
-    ax.spines['right'].set_color(STREAMLIT_BG)
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white')
-
     # Plot line
     ax.plot(short_months, month_counts.values, marker='o', color='lightgreen', linewidth=2)
 
@@ -381,13 +317,9 @@ def monthly_message_count_plot(df):
 
 
 
-def weekday_message_count_plot(df):
-    # Extract full weekday names
-    df['weekday'] = df['date'].dt.day_name()
-
-    # Define full weekday order
-    weekday_order_full = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    weekday_counts = df['weekday'].value_counts().reindex(weekday_order_full)
+def weekday_message_count_plot(df, selected_user="Overall"):
+    # Count messages per weekday (0 = Monday)
+    weekday_counts = activity.activity_for(df).per_weekday(selected_user)
 
     # Convert to short form for display
     weekday_short = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
@@ -395,15 +327,6 @@ def weekday_message_count_plot(df):
 
     fig, ax = plt.subplots(figsize=(9, 9.4))
 
-    fig.patch.set_facecolor('none')
-    fig.patch.set_edgecolor('none')
-    ax.set_facecolor(STREAMLIT_BG)
-
-    ax.spines['top'].set_color(STREAMLIT_BG)
-    ax.spines['right'].set_color(STREAMLIT_BG)
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white')
-
     ax.plot(weekday_counts.index, weekday_counts.values, marker='o', color='orange', linewidth=2)
 
     ax.set_xticks(weekday_counts.index)
@@ -422,27 +345,15 @@ def weekday_message_count_plot(df):
 
 
 
-def avg_monthly_message_count_plot(df):
-    # Convert month to short form  (January -> Jan)
-    df['month_short'] = df['month'].apply(lambda x: datetime.strptime(x, "%B").strftime("%b"))
+def avg_monthly_message_count_plot(df, selected_user="Overall"):
+    # Mean over the years each month has messages in
+    monthly_avg = activity.activity_for(df).avg_per_month(selected_user)
 
-    # Group by year and short month name, count, then take mean over years
-    monthly_avg = (df.groupby(['year', 'month_short']).size().groupby(level=1).mean()
-        .reindex(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]))
+    # Convert month to short form  (1 -> Jan)
+    monthly_avg.index = list(calendar.month_abbr)[1:]
 
     fig, ax = plt.subplots(figsize=(9, 9.4))
 
-    # Match background
-    fig.patch.set_facecolor('none')
-    fig.patch.set_edgecolor('none')
-    ax.set_facecolor(STREAMLIT_BG)
-
-    # Match spines
-    ax.spines['top'].set_color(STREAMLIT_BG)
-    ax.spines['right'].set_color(STREAMLIT_BG)
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white')
-
     # Plot line
     ax.plot(monthly_avg.index, monthly_avg.values, marker='o', color='yellow', linewidth=2)
 
@@ -465,32 +376,14 @@ def avg_monthly_message_count_plot(df):
 
 
 
-def avg_weekday_message_count_plot(df):
-    df['weekday'] = df['date'].dt.day_name().str[:3]
-    df['week'] = df['date'].dt.isocalendar().week
-    df['year'] = df['date'].dt.year
-
+def avg_weekday_message_count_plot(df, selected_user="Overall"):
     weekday_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
-    # Group by weekday and count messages
-    weekday_counts = df.groupby('weekday').size()
-
-    # Count how many unique week-year combos each weekday appears in
-    weekday_weeks = df.groupby(['weekday'])[['year', 'week']].nunique()
-    weekday_weeks = weekday_weeks['week'].reindex(weekday_order).fillna(1)
-
-    # Compute average messages per weekday
-    avg_counts = (weekday_counts // weekday_weeks).reindex(weekday_order).fillna(0)
+    # Messages per weekday over how many of that weekday the active months hold
+    avg_counts = activity.activity_for(df).avg_per_weekday(selected_user)
+    avg_counts.index = weekday_order
 
     fig, ax = plt.subplots(figsize=(9, 9.4))
-    fig.patch.set_facecolor('none')
-    fig.patch.set_edgecolor('none')
-    ax.set_facecolor(STREAMLIT_BG)
-
-    ax.spines['top'].set_color(STREAMLIT_BG)
-    ax.spines['right'].set_color(STREAMLIT_BG)
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white')
 
     ax.plot(avg_counts.index, avg_counts.values, marker='o', color='pink', linewidth=2)
 
@@ -509,70 +402,12 @@ def avg_weekday_message_count_plot(df):
 
 
 
-def hourly_message_count_plot(df, selected_user="Overall"): 
-    df_copy = df.copy()
-    
-    if selected_user != "Overall":
-        if 'user' in df_copy.columns:
-            df_copy = df_copy[df_copy['user'] == selected_user]
-            print(f"Filtered to user '{selected_user}': {len(df_copy)} messages")
-        elif 'name' in df_copy.columns:
-            df_copy = df_copy[df_copy['name'] == selected_user]
-            print(f"Filtered to user '{selected_user}': {len(df_copy)} messages")
-        elif 'sender' in df_copy.columns:
-            df_copy = df_copy[df_copy['sender'] == selected_user]
-            print(f"Filtered to user '{selected_user}': {len(df_copy)} messages")
-        else:
-            print("Warning: No user/name/sender column found, showing overall data")
-    
-    if len(df_copy) == 0:
-        print(f"No messages found for user '{selected_user}'")
-        return None
-    
-    if 'time' in df_copy.columns and 'date' in df_copy.columns:
-        try:
-            df_copy['datetime'] = pd.to_datetime(df_copy['date'].astype(str) + ' ' + df_copy['time'].astype(str))
-            df_copy['hour'] = df_copy['datetime'].dt.hour
-        except:
-            df_copy['hour'] = df_copy['time'].astype(str).str[:2].astype(int)
-    
-
-    elif 'date' in df_copy.columns:
-        try:
-            df_copy['hour'] = pd.to_datetime(df_copy['date']).dt.hour
-        except:
-            print("Error parsing date column")
-            return None
-
-    elif 'time' in df_copy.columns:
-        df_copy['hour'] = df_copy['time'].astype(str).str[:2].astype(int)
-    
-    else:
-        print("No suitable time/date column found")
-        return None
-    
-
-    # Ensure hour values are valid (0-23)
-    df_copy = df_copy[(df_copy['hour'] >= 0) & (df_copy['hour'] <= 23)]
-    
+def hourly_message_count_plot(df, selected_user="Overall"):
+    # Messages per hour of the day
+    hourly_counts = activity.activity_for(df).per_hour(selected_user)
 
-    # Debug: Check the hour extraction 
-    print(f"Hour range: {df_copy['hour'].min()} to {df_copy['hour'].max()}") 
-    print(f"Unique hours: {sorted(df_copy['hour'].unique())}") 
-    print(f"Total messages after filtering: {len(df_copy)}") 
-     
-
-    # Group by hour and get total messages per hour 
-    hourly_counts = df_copy.groupby('hour').size().reindex(range(24), fill_value=0) 
-     
-    print(f"Hourly counts: {hourly_counts.to_dict()}") 
-    print(f"Max hourly count: {hourly_counts.max()}") 
-    
-
-    # Check if we have any data
     if hourly_counts.sum() == 0:
-        print("WARNING: No messages found in any hour!")
-        print("Check your data format and time/date columns")
+        print(f"No messages found for user '{selected_user}'")
         return None
  
     # 12-hour format labels 
@@ -583,8 +418,6 @@ def hourly_message_count_plot(df, selected_user="Overall"):
  
     # Plotting 
     fig, ax = plt.subplots(figsize=(16, 10)) 
-    fig.patch.set_facecolor('none') 
-    ax.set_facecolor(STREAMLIT_BG) 
  
     # Bars
     bars = ax.bar( 
@@ -611,12 +444,6 @@ def hourly_message_count_plot(df, selected_user="Overall"):
     ax.set_ylabel("Total Messages", color='white', fontsize=16, labelpad=20) 
     # ax.set_title(f"Hourly Text Messages", color='white', fontsize=18, pad=20) 
  
-    # Remove top/right spines 
-    ax.spines['top'].set_color(STREAMLIT_BG) 
-    ax.spines['right'].set_color(STREAMLIT_BG) 
-    ax.spines['left'].set_color('white') 
-    ax.spines['bottom'].set_color('white') 
- 
     # Remove any grid 
     ax.grid(False) 
  
@@ -636,6 +463,10 @@ def hourly_message_count_plot(df, selected_user="Overall"):
 def response_time_plot(response_times, avg, max_display_cap=25):
     """Plots a histogram of response times with dynamic x and y scale adjustments."""
 
+    # Nobody answered anybody, e.g. only one participant has posted
+    if response_times.empty:
+        return None
+
     # Determine dynamic x-limit based on actual data
     max_response_time = response_times.max()
     x_limit = min(max_response_time, max_display_cap)
@@ -656,8 +487,6 @@ def response_time_plot(response_times, avg, max_display_cap=25):
 
     # Plot
     fig, ax = plt.subplots(figsize=(9, 6))
-    fig.patch.set_facecolor('none')
-    ax.set_facecolor(STREAMLIT_BG)
 
     ax.hist(filtered, bins=50, color="#ca43d6")
 
@@ -668,10 +497,6 @@ def response_time_plot(response_times, avg, max_display_cap=25):
     ax.set_ylabel("Frequency", color='white', fontsize=14, labelpad=20)
     ax.tick_params(axis='x', colors='white')
     ax.tick_params(axis='y', colors='white')
-    ax.spines['top'].set_color(STREAMLIT_BG)
-    ax.spines['right'].set_color(STREAMLIT_BG)
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white')
 
     # Title
     hr = int(avg // 60)
@@ -687,24 +512,9 @@ def heatmap_weekday_vs_hour(df, selected_user="Overall"):
     Draws a gradient heatmap showing message counts by day of week and hour of day.
     """
 
-    if selected_user == "Overall":
-        df = df[df['user'] != 'group_notification'].copy()
-    else:
-        df = df[df['user'] == selected_user].copy()
-
-    # Ensure hour is numeric
-    df['hour'] = pd.to_numeric(df['hour'], errors='coerce').fillna(0).astype(int)
-
-    # Create day name column (Monday, Tuesday, ...)
-    df['day_name'] = pd.to_datetime(df['date'], errors='coerce').dt.day_name()
-
-    # Count messages grouped by weekday and hour
-    heatmap_data = df.groupby(['day_name', 'hour']).size().unstack(fill_value=0)
-
-    # Reorder and map weekdays
-    full_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    # Messages per weekday (0 = Monday) and hour
+    heatmap_data = pd.DataFrame(activity.activity_for(df).weekday_hour(selected_user))
     short_days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    heatmap_data = heatmap_data.reindex(full_days)
 
     # Convert 24-hour to 12-hour format
     hour_labels = [f"{(h % 12 or 12)} {'AM' if h < 12 else 'PM'}" for h in heatmap_data.columns]
@@ -712,8 +522,6 @@ def heatmap_weekday_vs_hour(df, selected_user="Overall"):
 
     # Plotting
     fig, ax = plt.subplots(figsize=(12, 5))
-    fig.patch.set_facecolor('none')
-    ax.set_facecolor('#0E1117')
 
     sns.heatmap(
         heatmap_data,
@@ -756,26 +564,16 @@ def plot_day_night_activity_pie(df, selected_user="Overall"):
     Night: 6 PM - 5:59 AM
     """
 
-    if selected_user == "Overall":
-        df = df[df['user'] != 'group_notification']
-    else:
-        df = df[df['user'] == selected_user]
-
-    df['hour'] = pd.to_numeric(df['hour'], errors='coerce').fillna(0).astype(int)
-
     # Classify hours into Day and Night
-    df['period'] = df['hour'].apply(lambda hour: 'Day' if 6 <= hour < 18 else 'Night')
-    counts = df['period'].value_counts().to_dict()
-    counts.setdefault("Day", 0)
-    counts.setdefault("Night", 0)
+    hourly = activity.activity_for(df).per_hour(selected_user)
+    day = int(hourly.loc[6:17].sum())
+    counts = {"Day": day, "Night": int(hourly.sum()) - day}
 
     labels = ['Day', 'Night']
     sizes = [counts['Day'], counts['Night']]
     colors = ["#fffd6f", "#272AED"] 
 
     fig, ax = plt.subplots()
-    fig.patch.set_facecolor('none')
-    ax.set_facecolor('#0E1117')
 
     wedges, texts, autotexts = ax.pie(
         sizes,
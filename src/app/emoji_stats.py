@@ -0,0 +1,112 @@
+import re
+from collections import Counter
+from functools import lru_cache
+import emoji
+import numpy as np
+import pandas as pd
+
+
+# Every emoji has a non-ASCII code point; only keycaps (#, * and digits + U+20E3) start with ASCII
+NON_ASCII_RUN = re.compile(r"[^\x00-\x7f]+")
+KEYCAP = re.compile(r"[#*0-9]\ufe0f?\u20e3")
+
+
+def char_class(chars):
+    """ Regex character class of chars written as code point ranges, which re tests much faster """
+
+    codes = sorted(set(map(ord, chars)))
+    ranges = []
+    start = prev = codes[0]
+
+    for code in codes[1:]:
+        if code != prev + 1:
+            ranges.append((start, prev))
+            start = code
+        prev = code
+    ranges.append((start, prev))
+
+    parts = [re.escape(chr(low)) + ("-" + re.escape(chr(high)) if high > low else "") for low, high in ranges]
+
+    return "[" + "".join(parts) + "]"
+
+
+def trie_pattern(words):
+    """
+    Regex matching any of words, longest first, written as a trie so that each position
+    tests one character per level instead of every word in turn
+    """
+
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A word ending here is only taken when no longer word continues it
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+@lru_cache(maxsize=None)
+def emoji_pattern():
+    """ Compiled regex for every emoji of the installed emoji package, including ZWJ sequences, skin tones and flags """
+
+    # The lookahead rejects ordinary characters before the trie is entered
+    first = char_class({word[0] for word in emoji.EMOJI_DATA})
+    return re.compile("(?=" + first + ")" + trie_pattern(emoji.EMOJI_DATA))
+
+
+def find_emojis(text):
+    """ Every emoji in text; the trie only runs over the non-ASCII runs and keycaps, not the whole text """
+
+    pattern = emoji_pattern()
+    found = pattern.findall("\n".join(NON_ASCII_RUN.findall(text)))
+
+    # Keycaps are rare, look around each U+20E3 instead of testing every digit
+    keycaps = []
+    end = text.find("\u20e3")
+    while end != -1:
+        match = KEYCAP.fullmatch(text, max(end - 2, 0), end + 1) or KEYCAP.fullmatch(text, max(end - 1, 0), end + 1)
+        if match:
+            keycaps.append(match.group())
+        end = text.find("\u20e3", end + 1)
+
+    if keycaps:
+        found += pattern.findall("\n".join(keycaps))
+
+    return found
+
+
+def user_emoji_counts(messages, users):
+    """ Emoji Counter of every user, scanning each user's messages as one batch """
+
+    values = messages.astype(str).tolist()
+
+    # Every emoji has a non-ASCII code point, and isascii is a flag check, so plain text costs nothing
+    candidates = np.fromiter((not value.isascii() for value in values), dtype=bool, count=len(values))
+
+    batches = pd.Series(values, dtype=object)[candidates]
+
+    return {
+        user: Counter(find_emojis("\n".join(batch)))
+        for user, batch in batches.groupby(np.asarray(users)[candidates])
+    }
+
+
+def top_emojis(counts, n=10):
+    """ The n most used emoji of a Counter as a table of emoji, name and count """
+
+    top = counts.most_common(n)
+
+    return pd.DataFrame({
+        'emoji': [e for e, _ in top],
+        'name': [emoji.EMOJI_DATA[e]['en'].strip(':').replace('_', ' ') for e, _ in top],
+        'count': [count for _, count in top],
+    })
@@ -1,9 +1,20 @@
-import re
-import emoji
-from datetime import timedelta
+import calendar
+import activity
+import chat_stats
+import emoji_stats
+import streaks
+import latency
+import numpy as np
 import pandas as pd
 
 
+# Timeline resolution by date span: daily up to half a year, weekly up to three years, monthly beyond
+TIMELINE_RESOLUTIONS = [(183, 'D'), (3 * 366, 'W-MON'), (None, 'MS')]
+
+# Points averaged by the timeline's rolling average at each resolution
+ROLLING_WINDOWS = {'D': 7, 'W-MON': 4, 'MS': 3}
+
+
 def format_hour(hr):
     if hr == 0: return "12 A.M"
     elif hr < 12: return f"{hr} A.M"
@@ -25,23 +36,11 @@ def participant_counts(df):
 
 
 def messages_sent(user, df):
-    if (user != "Overall"):
-        return df[df['user'] == user].shape[0]
-    
-    else:
-        return df[df['user'] != 'group_notification'].shape[0]
+    return chat_stats.stats_for(df).value(user, 'messages')
 
 
 def words_typed(user, df):
-    if (user != "Overall"):
-        user_df = df[df['user'] == user]
-
-    else:
-        user_df = df[df['user'] != 'group_notification']
-
-    words_count = user_df['message'].apply(lambda msg: len(str(msg).split())).sum()
-
-    return words_count
+    return chat_stats.stats_for(df).value(user, 'words')
 
 
 def member_count(df):
@@ -49,156 +48,70 @@ def member_count(df):
 
 
 def avg_msg_length(user, df):
-    return round(words_typed(user, df) / messages_sent(user, df))
+    row = chat_stats.stats_for(df).row(user)
+    return round(row['words'] / row['messages'])
 
 
 def longest_message(user, df):
-    if user != "Overall":
-        user_df = df[df['user'] == user]
-    else:
-        user_df = df[df['user'] != 'group_notification']
-
-    user_df['word_count'] = user_df['message'].astype(str).apply(lambda x: len(x.split()))
-
-    longest_msg = user_df['word_count'].max()
-
-    return longest_msg
+    return chat_stats.stats_for(df).value(user, 'max_words')
 
 
 def unique_words_used(user, df):
-    if user != "Overall":
-        user_df = df[df['user'] == user]
-    else:
-        user_df = df[df['user'] != 'group_notification']
-
-    all_messages = " ".join(user_df['message'].astype(str))
-    words = re.findall(r'\b\w+\b', all_messages.lower())
-    unique_words = set(words)
-
-    return len(unique_words)
-
-
-def files_shared(user, df):
-    if user != "Overall":
-        df = df[df['user'] == user]
-
-    patterns = {
-        'media': r"<media omitted>",
-        'document': r"<document omitted>",
-        'gif': r"<gif omitted>",
-        'image': r"<image omitted>",
-        'video': r"<video omitted>",
-    }
-
-    counts = {}
-
-    for label, pattern in patterns.items():
-        counts[label] = df['message'].apply(lambda msg: bool(re.search(pattern, str(msg), re.IGNORECASE))).sum()
-
-
-    counts['total_files_shared'] = sum(counts.values())
-
-    return counts
-
+    return chat_stats.stats_for(df).value(user, 'unique_words')
 
 
 def media_shared(user, df):
-    media_extensions_regex = r'\.(jpg|jpeg|png|gif|webp|mp4|3gp|mkv|mov|mp3|opus|m4a|aac)\b'
-    
-    excluded_extensions_regex = r'\.(pdf|docx?|xlsx?|pptx?|vcf|txt|zip|rar)\b'
-
-    media_placeholders = [
-        r"<Media omitted>",
-        r"image omitted",
-        r"video omitted",
-        r"audio omitted",
-    ]
-    placeholder_regex = '|'.join(media_placeholders)
+    return chat_stats.stats_for(df).value(user, 'media')
 
-    user_df = df[df['user'] == user].copy() if user != "Overall" else df.copy()
 
-    has_media_ext = user_df['message'].str.contains(media_extensions_regex, case=False, na=False, regex=True)
-    not_doc_ext   = ~user_df['message'].str.contains(excluded_extensions_regex, case=False, na=False, regex=True)
-    has_placeholder = user_df['message'].str.contains(placeholder_regex, case=False, na=False, regex=True)
+def media_counts(df):
+    """ Media messages of every participant at once, as a Series indexed by user """
 
-    media_count = ((has_media_ext & not_doc_ext) | has_placeholder).sum()
-
-    return media_count
+    return chat_stats.stats_for(df).per_user('media')
 
 
 def links_shared(user, df):
-    if user != "Overall":
-        user_df = df[df['user'] == user]
-
-    else:
-        user_df = df[df['user'] != 'group_notification']
-
-
-    user_df = user_df.dropna(subset=['message'])
-
-    link_pattern = r'(https?://\S+|www\.\S+)'
-
-    link_messages = user_df['message'].astype(str).str.contains(link_pattern, regex=True)
-
-    return link_messages.sum()
+    return chat_stats.stats_for(df).value(user, 'links')
 
 
 def emojis_used(user, df):
-    if user != "Overall":
-        user_df = df[df['user'] == user]
-    else:
-        user_df = df[df['user'] != 'group_notification']
-
-    # Concatenate all messages
-    all_messages = " ".join(user_df['message'].astype(str))
-
-    # Extract emojis
-    emojis_list = [char for char in all_messages if char in emoji.EMOJI_DATA]
-
-    total_emojis = len(emojis_list)
-
-    # Count emojis manually
-    emoji_counts = {}
-    for e in emojis_list:
-        emoji_counts[e] = emoji_counts.get(e, 0) + 1
-
-    # Print emoji frequencies
-    # if emoji_counts:
-    #    print("Emoji Usage Frequencies:")
-    #    for e in sorted(emoji_counts, key=emoji_counts.get, reverse=True):
-    #        print(f"{e} : {emoji_counts[e]}")
-    # else:
-    #   print("No emojis used.")
+    emoji_counts = chat_stats.stats_for(df).emoji_counts(user)
 
     # Find most used emoji
     if emoji_counts:
-        most_used_emoji = max(emoji_counts, key=emoji_counts.get)
-        most_used_emoji_count = emoji_counts[most_used_emoji]
+        most_used_emoji, most_used_emoji_count = emoji_counts.most_common(1)[0]
     else:
         most_used_emoji = None
         most_used_emoji_count = 0
 
     return {
-        "total_emojis_used": total_emojis,
+        "total_emojis_used": sum(emoji_counts.values()),
         "most_used_emoji": most_used_emoji,
         "most_used_emoji_count": most_used_emoji_count
     }
 
 
 
+def top_emojis(user, df, n=10):
+    """ Table of the n emoji a user (or "Overall") used most, with their names and counts """
+
+    return emoji_stats.top_emojis(chat_stats.stats_for(df).emoji_counts(user), n)
+
+
+
 def group_created(df):
     group_created = df['message'].str.contains("created group", case=False, na=False)
 
     if group_created.any():
         created_row = df[group_created].iloc[0]
-        return created_row['date']
+        return created_row['timestamp']
     
     # Fallback: return the timestamp of the first message (for direct messages)
     encryption_pattern = r"Messages and calls are end-to-end encrypted"
     non_encrypted_df = df[~df['message'].str.contains(encryption_pattern, case=False, na=False)]
 
     if not non_encrypted_df.empty:
-        return non_encrypted_df.iloc[0]['date']
+        return non_encrypted_df.iloc[0]['timestamp']
     
     return None
 
@@ -207,145 +120,107 @@ def date_joined(user, df):
     pass
 
 
-def most_active_times(df):
-    most_year = df['year'].mode()[0]
-    most_month = df['month'].mode()[0]
-    most_day = df['date'].dt.date.mode()[0]
-    return most_year, most_month, most_day
-
-
-def messages_per_year(df):
-    df['year'] = df['datetime'].dt.year
-    return df.groupby('year').size().reset_index(name='message_count')
+def most_active_times(user, df):
+    cube = activity.activity_for(df)
+    most_year = cube.per_year(user).idxmax()
+    most_month = calendar.month_name[cube.per_month(user).idxmax()]
 
-
-def avg_messages_per_month(df):
-    df['month'] = df['datetime'].dt.month
-    monthly_counts = df.groupby(['year', 'month']).size().reset_index(name='message_count')
-    avg_monthly = monthly_counts.groupby('month')['message_count'].mean().reset_index()
-
-    return avg_monthly
-
-
-def avg_messages_per_weekday(df):
-    df['weekday'] = df['datetime'].dt.weekday
-    weekday_counts = df.groupby(['year', 'month', 'day', 'weekday']).size().reset_index(name='message_count')
-    avg_weekday = weekday_counts.groupby('weekday')['message_count'].mean().reset_index()
-
-    return avg_weekday
+    # Days are finer than the activity cube, the busiest one comes from the user's timestamps
+    rows = df['event_type'] == 'message' if user == "Overall" else df['user'] == user
+    most_day = df.loc[rows, 'timestamp'].dt.date.mode()[0]
+    return most_year, most_month, most_day
 
 
 def first_message_date(selected_user, df):
     if selected_user != "Overall":
         df = df[df['user'] == selected_user]
 
-    return df['date'].min()
+    return df['timestamp'].min()
 
 
 def last_message_date(selected_user, df):
     if selected_user != "Overall":
         df = df[df['user'] == selected_user]
 
-    return df['date'].max()
+    return df['timestamp'].max()
 
 
 def longest_active_streak(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-    df['date'] = df['date'].dt.date
-    active_days = df['date'].drop_duplicates().sort_values()
-    max_streak = streak = 1
-    for i in range(1, len(active_days)):
-        if (active_days.iloc[i] - active_days.iloc[i - 1]) == timedelta(days=1):
-            streak += 1
-            max_streak = max(max_streak, streak)
-        else:
-            streak = 1
-
-    return max_streak
+    return streaks.user_streaks(selected_user, df).longest_active
 
 
 def longest_inactive_streak(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-    df['date'] = df['date'].dt.date
-    active_days = df['date'].drop_duplicates().sort_values()
-    max_gap = timedelta(days=0)
-    for i in range(1, len(active_days)):
-        gap = active_days.iloc[i] - active_days.iloc[i - 1]
-        if gap > timedelta(days=1):
-            max_gap = max(max_gap, gap)
-
-    return max_gap.days
+    return streaks.user_streaks(selected_user, df).longest_inactive
 
 
 
 def response_times(df):
     """
-    Calculates response time (in minutes) between consecutive user messages. Ignores 'group_notification's. """
+    Calculates reply times (in minutes): the gap before a message, counted only when it answers someone else.
+    Ignores 'group_notification's. """
 
-    user_df = df[df["user"] != "group_notification"].copy()
+    overall = latency.latency_for(df).overall
 
-    # Construct datetime from 'date' and 'time' columns
-    user_df['datetime'] = pd.to_datetime(user_df['date'].astype(str) + ' ' + user_df['time'].astype(str), 
-                                         errors='coerce')
+    # The first message of the chat answers nobody
+    if overall.summary.empty:
+        return {"avg": np.nan, "median": np.nan, "all_deltas": pd.Series(dtype='float64')}
 
-    # Drop rows where datetime conversion failed (if any)
-    user_df.dropna(subset=['datetime'], inplace=True)
+    return {
+        "avg": round(overall.summary['mean'].iloc[0], 2),
+        "median": round(overall.summary['p50'].iloc[0], 2),
+        "all_deltas": pd.Series(overall.minutes, name='response_time')
+    }
 
-    # Sort chronologically
-    user_df.sort_values("datetime", inplace=True)
 
-    # Compute time differences in minutes
-    user_df['response_time'] = user_df['datetime'].diff().dt.total_seconds() / 60.0
+def timeline_counts(df, resolution=None):
+    """
+    User messages per day, week or month up to today, from the daily counts kept in the
+    chat's stats; the resolution is picked from the date span unless given
+    """
 
-    # Drop the first row which has NaN
-    response_times = user_df['response_time'].dropna()
+    daily = chat_stats.stats_for(df).daily
+    daily = daily[daily.index <= pd.Timestamp.now().normalize()]
 
-    return {
-        "avg": round(response_times.mean(), 2),
-        "median": round(response_times.median(), 2),
-        "all_deltas": response_times
-    }
+    if resolution is None:
+        span = (daily.index[-1] - daily.index[0]).days if len(daily) else 0
+        resolution = next(freq for limit, freq in TIMELINE_RESOLUTIONS if limit is None or span <= limit)
 
+    if len(daily) == 0:
+        return daily, resolution
 
-def is_media_included(df):
-    media_extensions_regex = r'\.(jpg|jpeg|png|gif|webp|mp4|3gp|mkv|mov|mp3|opus|m4a|aac)\b'
+    # Weeks start on Monday and are labelled by it, like months by their first day
+    counts = daily.resample(resolution, closed='left', label='left').sum()
 
-    media_placeholders = [
-        r"<Media omitted>",
-        r"image omitted",
-        r"video omitted",
-        r"audio omitted",
-    ]
-    placeholder_regex = '|'.join(media_placeholders)
+    return counts, resolution
 
-    has_media_extensions = df['message'].str.contains(media_extensions_regex, case=False, na=False, regex=True)
-    has_placeholders = df['message'].str.contains(placeholder_regex, case=False, na=False, regex=True)
 
-    return has_media_extensions.any() and not has_placeholders.any()
 
+def hour_weekday_counts(user, df):
+    """ Messages per (weekday, hour) as a long frame of all 7 × 24 cells, weekday 0 = Monday """
 
+    counts = activity.activity_for(df).weekday_hour(user)
 
+    return pd.DataFrame({
+        'weekday': np.repeat(np.arange(7), 24),
+        'hour': np.tile(np.arange(24), 7),
+        'messages': counts.ravel(),
+    })
 
 
-def count_media_docs_contacts(df, selected_user):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
 
-    # Count media types
-    image_count = df['message'].str.contains(r'\.(jpg|jpeg|png|gif|webp)', case=False, na=False).sum()
-    video_count = df['message'].str.contains(r'\.(mp4|3gp|mkv|mov)', case=False, na=False).sum()
-    audio_count = df['message'].str.contains(r'\.(opus|mp3|m4a|aac)', case=False, na=False).sum()
+def is_media_included(df):
+    # Media files attached to the export, rather than replaced by "<Media omitted>" placeholders
+    attached = (df['image'] | df['video'] | df['audio']) & ~df['placeholder']
+
+    return attached.any() and not df['placeholder'].any()
 
-    # Count documents
-    doc_extensions = r'\.(pdf|docx?|xlsx?|pptx?|txt|zip|rar|csv)'
-    doc_count = df['message'].str.contains(doc_extensions, case=False, na=False).sum()
 
-    # Count contacts
-    contact_keywords = r'(contact card|shared a contact|vcf)'
-    contact_count = df['message'].str.contains(contact_keywords, case=False, na=False).sum()
 
-    return image_count, video_count, audio_count, doc_count, contact_count
 
 
+def count_media_docs_contacts(df, selected_user):
+    row = chat_stats.stats_for(df).row(selected_user)
+
+    image_count, video_count, audio_count, doc_count, contact_count = row[['image', 'video', 'audio', 'document', 'contact']]
+
+    return image_count, video_count, audio_count, doc_count, contact_count
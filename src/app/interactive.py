@@ -0,0 +1,76 @@
+import altair as alt
+import pandas as pd
+import streamlit as st
+import chat_stats
+import helper
+import memo
+
+
+# Opt-in from the sidebar: charts go to the browser as Vega-Lite specs over the
+# pre-aggregated series, so zoom, hover and filtering cost the server nothing
+TOGGLE_KEY = "interactive_charts"
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+RESOLUTION_UNITS = {'D': "day", 'W-MON': "week", 'MS': "month"}
+
+
+def enabled():
+    return st.session_state.get(TOGGLE_KEY, False)
+
+
+def backend_toggle():
+    st.sidebar.toggle("Interactive charts", key=TOGGLE_KEY,
+                      help="Zoom, hover and filter in the browser instead of static images")
+
+
+def timeline_chart(df):
+    """ Messages over time at the timeline's resolution; drag to pan, scroll to zoom """
+
+    counts, resolution = memo.metric(helper.timeline_counts, df)
+    unit = RESOLUTION_UNITS[resolution]
+    data = pd.DataFrame({'date': counts.index, 'messages': counts.values})
+
+    return alt.Chart(data).mark_line(color="#79f245").encode(
+        x=alt.X('date:T', title=None),
+        y=alt.Y('messages:Q', title=f"Messages per {unit}"),
+        tooltip=[alt.Tooltip('date:T', title=unit.capitalize()), alt.Tooltip('messages:Q', title="Messages")],
+    ).properties(height=380).interactive(bind_y=False)
+
+
+def participants_chart(df):
+    """ Text messages of every participant, largest first """
+
+    totals = chat_stats.stats_for(df).per_user('messages')
+    data = pd.DataFrame({'user': totals.index.astype(str), 'messages': totals.values})
+
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X('user:N', sort='-y', title="Participants"),
+        y=alt.Y('messages:Q', title="Text Messages"),
+        color=alt.Color('user:N', legend=None),
+        tooltip=[alt.Tooltip('user:N', title="Participant"), alt.Tooltip('messages:Q', title="Messages")],
+    ).properties(height=420)
+
+
+def hourly_chart(df, selected_user):
+    """ Messages per hour, filtered to one weekday in the browser from the 7 × 24 counts """
+
+    data = memo.metric(helper.hour_weekday_counts, df, user=selected_user).copy()
+    data['weekday'] = [WEEKDAYS[day] for day in data['weekday']]
+
+    weekday = alt.param(
+        name="weekday",
+        value="All",
+        bind=alt.binding_select(options=["All"] + WEEKDAYS, name="Weekday "),
+    )
+
+    return alt.Chart(data).mark_bar(color="skyblue").encode(
+        x=alt.X('hour:O', title="Hour"),
+        y=alt.Y('sum(messages):Q', title="Total Messages"),
+        tooltip=[alt.Tooltip('hour:O', title="Hour"), alt.Tooltip('sum(messages):Q', title="Messages")],
+    ).add_params(weekday).transform_filter(
+        "weekday == 'All' || datum.weekday == weekday"
+    ).properties(height=420)
+
+
+def show(chart):
+    st.altair_chart(chart, use_container_width=True)
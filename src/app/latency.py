@@ -0,0 +1,85 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import chat_stats
+
+
+# Quantiles summarised for every distribution, interpolated like np.percentile
+QUANTILES = np.array([0.5, 0.75, 0.9, 0.95, 0.99])
+
+# Reply latencies (minutes) grouped by key: minutes[offsets[i]:offsets[i + 1]] are the
+# sorted latencies of summary.index[i]; summary holds count, mean and the quantiles
+Distribution = namedtuple('Distribution', ['offsets', 'minutes', 'summary'])
+
+# Distributions over every reply, per replying user and per (responder, replied_to) pair
+ReplyLatency = namedtuple('ReplyLatency', ['overall', 'users', 'pairs'])
+
+
+def distribution(keys, minutes, index):
+    """ Group latencies by integer key; index(unique_keys) labels the summary rows """
+
+    order = np.lexsort((minutes, keys))
+    keys, minutes = keys[order], minutes[order]
+    unique, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+
+    columns = [f"p{round(q * 100)}" for q in QUANTILES]
+    if len(unique) == 0:
+        summary = pd.DataFrame(columns=['count', 'mean'] + columns, index=index(unique), dtype='float64')
+        return Distribution(np.zeros(1, np.int64), minutes.astype(np.float32), summary)
+
+    # Quantiles of every group at once: positions inside the sorted group, then linear interpolation
+    position = starts[:, None] + QUANTILES[None, :] * (counts[:, None] - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    weight = position - low
+    quantiles = minutes[low] * (1 - weight) + minutes[high] * weight
+
+    summary = pd.DataFrame(quantiles, columns=columns, index=index(unique))
+    summary.insert(0, 'count', counts)
+    summary.insert(1, 'mean', np.add.reduceat(minutes, starts) / counts)
+
+    return Distribution(np.append(starts, len(keys)), minutes.astype(np.float32), summary)
+
+
+def reply_latencies(df):
+    """ Minutes until someone else answers, measured only where the sender changes """
+
+    messages = (df['event_type'] == 'message').values
+    stamps = df['timestamp'].values[messages].astype(np.int64)
+    codes, users = pd.factorize(df['user'].values[messages])
+    users = np.asarray(users, dtype=object)
+
+    if len(stamps) > 1 and (np.diff(stamps) < 0).any():
+        order = np.argsort(stamps, kind='stable')
+        stamps, codes = stamps[order], codes[order]
+
+    replies = codes[1:] != codes[:-1]
+    minutes = np.diff(stamps)[replies] / 60e9
+    responder = codes[1:][replies].astype(np.int64)
+    replied_to = codes[:-1][replies].astype(np.int64)
+    n = len(users)
+
+    def pair_index(keys):
+        return pd.MultiIndex.from_arrays([users[keys // n], users[keys % n]], names=['responder', 'replied_to'])
+
+    return ReplyLatency(
+        distribution(np.zeros(len(minutes), np.int64), minutes, lambda keys: pd.Index(["Overall"] * len(keys))),
+        distribution(responder, minutes, lambda keys: pd.Index(users[keys], name='user')),
+        distribution(responder * n + replied_to, minutes, pair_index),
+    )
+
+
+def latency_for(df):
+    """ reply_latencies of a parsed chat, computed once per chat """
+
+    return chat_stats.derived(df, 'latency', reply_latencies)
+
+
+def latencies_of(dist, key):
+    """ Sorted latencies of one key of a Distribution, empty when it never replied """
+
+    if key not in dist.summary.index:
+        return np.empty(0, np.float32)
+
+    i = dist.summary.index.get_loc(key)
+    return dist.minutes[dist.offsets[i]:dist.offsets[i + 1]]
@@ -0,0 +1,50 @@
+import importlib
+import streamlit as st
+import chat_stats
+import draw
+import helper
+import render
+
+
+# Upper bound on cached results per cache, old entries are dropped first
+MAX_ENTRIES = 512
+
+
+def resolve(module_name, func_name):
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+# The frame is not hashed, chat_id identifies it
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def cached_value(module_name, func_name, chat_id, kwargs, _df):
+    return resolve(module_name, func_name)(df=_df, **dict(kwargs))
+
+
+# Charts are kept as their rendered image bytes; the figure is closed once rendered
+@st.cache_resource(max_entries=MAX_ENTRIES, show_spinner=False)
+def cached_chart(module_name, func_name, chat_id, kwargs, fmt, _df):
+    return render.render(resolve(module_name, func_name), fmt, df=_df, **dict(kwargs))
+
+
+def metric(func, df, **kwargs):
+    """ func(df=<frame>, **kwargs) computed once per chat and arguments """
+
+    return cached_value(func.__module__, func.__name__, chat_stats.fingerprint(df), tuple(sorted(kwargs.items())), df)
+
+
+def chart(func, df, fmt="png", **kwargs):
+    """ PNG (or SVG) bytes of the figure func(df=<frame>, **kwargs), rendered once per chat and arguments """
+
+    return cached_chart(func.__module__, func.__name__, chat_stats.fingerprint(df), tuple(sorted(kwargs.items())), fmt, df)
+
+
+@st.cache_resource(max_entries=MAX_ENTRIES, show_spinner=False)
+def cached_response_time_chart(chat_id, _df):
+    rt_data = helper.response_times(_df)
+    return render.render(draw.response_time_plot, response_times=rt_data["all_deltas"], avg=rt_data["avg"])
+
+
+def response_time_chart(df):
+    """ Response time histogram, rendered once per chat """
+
+    return cached_response_time_chart(chat_stats.fingerprint(df), df)
@@ -1,126 +1,461 @@
+import codecs
+import gc
+import os
 import re
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 
 
-def update_ios_system_messages(df):
-    system_message_patterns = [
-        r"Messages and calls are end-to-end encrypted",
-        r"changed the subject", 
-        r"added", 
-        r"left", 
-        r"removed", 
-        r"changed this group's icon",
-        r"joined using this group's invite link", 
-        r"deleted this message",
-        r"created group", 
-        r"video call", 
-        r"Missed voice call", 
-        r"Missed video call",
-        r"this message was deleted", 
-        r"changed the group description",
-        r"Everyone is requested to reach the venue atlea", 
-        r"Please join this group",
-        r"https://chat\.whatsapp\.com/",
-        r"You were added",
-        r"security code changed",
-        r"now an admin",
-        r"no longer an admin"
-    ]
-
-    system_regex = re.compile("|".join(system_message_patterns), re.IGNORECASE)
-
-    system_message_mask = df['message'].str.contains(system_regex, na=False)
-    
-    df.loc[system_message_mask, 'user'] = "group_notification"    
-    return df
+# Exact layout of an export file, detected once by sniff_format
+#   platform:       'ios' ([date, time] user: msg) or 'android' (date, time - user: msg)
+#   dayfirst:       True / False, or None when the sample is ambiguous (resolved on the full file)
+#   four_digit_year, twelve_hour, seconds: shape of the date and time fields
+#   ampm_separator: text between the minutes and AM/PM, '\u202f' on recent exports
+Dialect = namedtuple('Dialect', ['platform', 'dayfirst', 'four_digit_year', 'twelve_hour', 'seconds', 'ampm_separator'])
+
+SNIFF_SAMPLE_LINES = 300
+
+# Bytes decoded and parsed at a time by preprocess_stream
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Characters below which preprocess stays serial even when workers are requested,
+# starting the process pool and shipping the shards costs more than it saves
+PARALLEL_THRESHOLD = 16 * 1024 * 1024
+
+# Loose header pattern, only ever run on the sample lines
+SNIFF_PATTERN = re.compile(
+    r"\u200e?(?P<bracket>\[)?(?P<first>\d{1,2})/(?P<second>\d{1,2})/(?P<year>\d{2,4}), "
+    r"\d{1,2}:\d{2}(?P<seconds>:\d{2})?(?:(?P<ampm_sep>[ \u202f]?)[APap][Mm])?(?P<close>\] | - )"
+)
+
+# Kinds of event_type; every value other than 'message' is a group notification
+EVENT_TYPES = ['message', 'join', 'leave', 'subject_change', 'admin_change', 'deleted', 'call', 'group_change', 'other']
+
+# Notification phrases, the first matching group names the event. Subject changes come first
+# because the quoted subject is free text
+EVENT_PATTERN = re.compile(
+    r"(?P<subject_change>changed the subject|changed the group name)"
+    r"|(?P<admin_change>now an admin|no longer an admin)"
+    r"|(?P<group_change>created group|changed this group's icon|deleted this group's icon"
+    r"|changed the group description|changed this group's settings)"
+    r"|(?P<deleted>this message was deleted|deleted this message)"
+    r"|(?P<call>missed voice call|missed video call|video call|voice call)"
+    r"|(?P<join>\badded\b|joined using this group's invite link|\bjoined\b)"
+    r"|(?P<leave>\bleft\b|\bremoved\b)"
+    r"|(?P<other>end-to-end encrypted|security code changed|changed their phone number)",
+    re.IGNORECASE
+)
+
+# A "user" no participant is called: a notification phrase or a quote, i.e. a notification whose
+# free text (a quoted subject) holds a colon
+NOT_A_NAME = re.compile(EVENT_PATTERN.pattern + r'|["\u201c\u201d]', re.IGNORECASE)
+
+# Notification text under a group name, as iOS exports without the LRM mark write it: a name or
+# number followed by the notification phrase
+NOTICE_SHAPE = re.compile(
+    r"\u200e?(?:You|\+?[\d ]{7,}|(?!I )[A-Z][^\s:]*(?: [A-Z][^\s:]*){0,3}) "
+    r"(?:added |removed |left$|joined using this group's invite link|created group|changed the subject"
+    r"|changed the group (?:name|description)|changed this group's|deleted this group's icon"
+    r"|is now an admin|is no longer an admin|changed their phone number)"
+)
+
+# Whole-message placeholders WhatsApp writes under the author's name
+AUTHORED_NOTICES = ['this message was deleted', 'you deleted this message', 'missed voice call', 'missed video call']
+
+# What a message carries, one content_kind per message; a message with several kinds takes the
+# first of document, contact, image, video, audio, media (an attachment of unknown type left out
+# of the export), link
+CONTENT_KINDS = ['text', 'link', 'image', 'video', 'audio', 'document', 'contact', 'media']
+MEDIA_KINDS = ['image', 'video', 'audio', 'media']
+
+# Boolean flag columns written next to content_kind, a message can set several of them.
+# Matched against lowercased text
+CONTENT_PATTERNS = {
+    'image': re.compile(r"\.(?:jpe?g|png|gif|webp)\b|\b(?:image|gif|sticker) omitted"),
+    'video': re.compile(r"\.(?:mp4|3gp|mkv|mov)\b|\bvideo omitted"),
+    'audio': re.compile(r"\.(?:opus|mp3|m4a|aac)\b|\baudio omitted"),
+    'document': re.compile(r"\.(?:pdf|docx?|xlsx?|pptx?|txt|zip|rar|csv)\b|\bdocument omitted"),
+    'contact': re.compile(r"contact card|shared a contact|\.vcf\b"),
+    'link': re.compile(r"https?://\S+|www\.\S+"),
+    'placeholder': re.compile(r"<media omitted>|\b(?:image|video|audio|gif|sticker|document|contact card) omitted"),
+}
+CONTENT_FLAGS = list(CONTENT_PATTERNS)
+
+# Anything any content pattern could match; only these messages are scanned per flag
+CONTENT_HINT = re.compile(
+    r"\.(?:jpe?g|png|gif|webp|mp4|3gp|mkv|mov|opus|mp3|m4a|aac|pdf|docx?|xlsx?|pptx?|txt|zip|rar|csv|vcf)\b"
+    r"|omitted|contact|https?://|www\."
+)
+
+# Header of any iOS or Android layout, used when sniff_format does not recognise the file
+GENERIC_HEADER = re.compile(r"""
+    ^\u200e?                                                # line start, optional LRM mark (iOS)
+    \[?                                                     # optional opening bracket (iOS)
+    (?P<date>\d{1,2}/\d{1,2}/\d{2,4}),\s*                   # date
+    (?P<time>\d{1,2}:\d{2}(?::\d{2})?\s*[APMapm\.]*)        # time with optional seconds + AM/PM
+    \]?                                                     # optional closing bracket (iOS)
+    (?:[ \t]*[\-\]][ \t]*)                                   # separator (- or ])
+""", re.VERBOSE | re.MULTILINE)
+
+
+def classify_events(messages, has_user, group_authored=True):
+    """
+    Tag each message with its event_type; only lines that can be notifications are regex-scanned.
+    group_authored is False for Android exports, which never put the group name before a notification
+    """
+
+    events = pd.Series(np.where(has_user, 'message', 'other'), index=messages.index, dtype=object)
+
+    # Authored lines are notifications only when iOS marks them with a leading LRM
+    # or when the whole text is a deleted/missed-call placeholder
+    candidates = (~has_user | messages.str.startswith('\u200e', na=False)
+                  | messages.str.strip('\u200e .').str.lower().isin(AUTHORED_NOTICES))
+
+    # or, on iOS, when the text under the group name reads like a notification
+    if group_authored:
+        candidates |= has_user & messages.str.match(NOTICE_SHAPE, na=False)
+
+    if candidates.any():
+        kinds = messages[candidates].str.extract(EVENT_PATTERN)
+        matched = kinds.notna().any(axis=1)
+        events[matched[matched].index] = kinds[matched].notna().idxmax(axis=1)
+
+    return pd.Categorical(events, categories=EVENT_TYPES)
+
+
+def content_candidates(messages):
+    """ Row positions the content hint matches and their lowercased text, from one scan over all messages """
+
+    values = messages.fillna('').tolist()
+    text = "\x00".join(values).lower()
+
+    # A few characters grow when lowercased, then lowercase one by one so offsets still line up
+    if len(text) != sum(map(len, values)) + max(len(values) - 1, 0):
+        values = [value.lower() for value in values]
+        text = "\x00".join(values)
+
+    lengths = np.fromiter(map(len, values), np.int64, len(values))
+    starts = np.cumsum(lengths + 1) - (lengths + 1)
+
+    hits = np.fromiter((match.start() for match in CONTENT_HINT.finditer(text)), np.int64)
+    rows = np.unique(np.searchsorted(starts, hits, side='right') - 1)
+
+    return rows, [text[starts[row]:starts[row] + lengths[row]] for row in rows]
+
+
+def classify_content(messages):
+    """ content_kind of each message and its flag columns; plain text is skipped after one hint scan """
+
+    rows, lowered = content_candidates(messages)
+
+    flags = {flag: np.zeros(len(messages), dtype=bool) for flag in CONTENT_FLAGS}
+    for flag, pattern in CONTENT_PATTERNS.items():
+        flags[flag][rows] = [pattern.search(value) is not None for value in lowered]
+    flags = pd.DataFrame(flags, index=messages.index)
+
+    kinds = np.select(
+        [flags['document'], flags['contact'], flags['image'], flags['video'], flags['audio'],
+         flags['placeholder'], flags['link']],
+        ['document', 'contact', 'image', 'video', 'audio', 'media', 'link'],
+        'text'
+    )
+
+    return pd.Categorical(kinds, categories=CONTENT_KINDS), flags
 
 
 # def translate_message(msg):
 #    return GoogleTranslator(source='auto', target='en').translate(msg)
 
 
-def preprocess(data):
-    # Combining both iOS and Android regex patterns
-    pattern = r"""
-        (?:                                                     # non-capturing group for full match
-            \[?                                                 # optional opening bracket (iOS)
-            (?P<date>\d{1,2}/\d{1,2}/\d{2,4}),\s*               # date
-            (?P<time>\d{1,2}:\d{2}(?::\d{2})?\s*[APMapm\.]*)    # time with optional seconds + AM/PM
-            \]?                                                 # optional closing bracket (iOS)
-            (?:\s*[\-\]]\s*)                                    # separator (- or ])
-            (?P<chat>.+)                                        # user and message
-        )
-    """
+def sniff_format(data, sample_lines=SNIFF_SAMPLE_LINES):
+    """ Work out the exact export layout from the first few hundred lines, None if unrecognised """
+
+    sample = data[:sample_lines * 512].splitlines()[:sample_lines]
+
+    layouts = Counter()
+    firsts, seconds = [], []
+    for line in sample:
+        match = SNIFF_PATTERN.match(line)
+        if match is None:
+            continue
+        bracketed = match.group('bracket') is not None
+        if bracketed != (match.group('close') == '] '):
+            continue
+
+        layouts[(
+            'ios' if bracketed else 'android',
+            len(match.group('year')) == 4,
+            match.group('ampm_sep') is not None,
+            match.group('seconds') is not None,
+            match.group('ampm_sep') or '',
+        )] += 1
+        firsts.append(int(match.group('first')))
+        seconds.append(int(match.group('second')))
+
+    if not layouts:
+        return None
+
+    platform, four_digit_year, twelve_hour, has_seconds, ampm_separator = layouts.most_common(1)[0][0]
+
+    dayfirst = None
+    if max(firsts) > 12:
+        dayfirst = True
+    elif max(seconds) > 12:
+        dayfirst = False
+
+    dialect = Dialect(platform, dayfirst, four_digit_year, twelve_hour, has_seconds, ampm_separator)
+
+    # The specialised pattern has to cover the sample, otherwise keep the generic parser
+    header_lines = sum(layouts.values())
+    matched = sum(1 for line in sample if header_pattern(dialect).match(line))
+    if matched < 0.9 * header_lines:
+        return None
+
+    return dialect
+
+
+@lru_cache(maxsize=None)
+def header_pattern(dialect):
+    """ Anchored regex for the timestamp header that starts every message, compiled once per dialect """
+
+    if dialect is None:
+        return GENERIC_HEADER
+
+    year = r"\d{4}" if dialect.four_digit_year else r"\d{2}"
+    time = r"\d{1,2}:\d{2}"
+    if dialect.seconds:
+        time += r":\d{2}"
+    if dialect.twelve_hour:
+        time += re.escape(dialect.ampm_separator) + r"[APap][Mm]"
+
+    if dialect.platform == 'ios':
+        header = rf"\u200e?\[(\d{{1,2}}/\d{{1,2}}/{year}), ({time})\] "
+    else:
+        header = rf"(\d{{1,2}}/\d{{1,2}}/{year}), ({time}) - "
+
+    return re.compile(rf"^{header}", re.MULTILINE)
+
+
+def dialect_formats(dialect, dayfirst):
+    """ Fixed strptime formats for the date and time fields of a dialect """
+
+    date_format = '%d/%m' if dayfirst else '%m/%d'
+    date_format += '/%Y' if dialect.four_digit_year else '/%y'
+
+    time_format = '%I:%M' if dialect.twelve_hour else '%H:%M'
+    if dialect.seconds:
+        time_format += ':%S'
+    if dialect.twelve_hour:
+        # strptime treats the (narrow) space as any whitespace
+        time_format += ' %p' if dialect.ampm_separator else '%p'
+
+    return date_format, time_format
+
 
-    matches = re.finditer(pattern, data, re.VERBOSE)
-
-    users = []
-    messages = []
-    dates = []
-    times = []
-
-    for match in matches:
-        date = match.group("date")
-        time = match.group("time").replace('\u202f', ' ').strip()
-        chat = match.group("chat").strip()
-
-        try:
-            date_obj = pd.to_datetime(date.strip(), dayfirst=True, errors='coerce')
-            if pd.isna(date_obj):
-                continue
-
-            # Normalize time (detect AM/PM or 24-hr)
-
-            # 12-hour format
-            if re.search(r'[APMapm]', time):  
-                time_obj = pd.to_datetime(time, format='%I:%M:%S %p', errors='coerce')
-                if pd.isna(time_obj):
-                    time_obj = pd.to_datetime(time, format='%I:%M %p', errors='coerce')
-
-            # 24-hour format
-            else:  
-                time_obj = pd.to_datetime(time, format='%H:%M:%S', errors='coerce')
-                if pd.isna(time_obj):
-                    time_obj = pd.to_datetime(time, format='%H:%M', errors='coerce')
-
-            if pd.isna(time_obj):
-                continue
-
-            time_obj = time_obj.time()
-
-            if ':' in chat:
-                user, message = chat.split(':', 1)
-                user = user.strip()
-                if user.lower() == "meta ai":
-                    continue
-                users.append(user)
-                messages.append(message.strip())
-            else:
-                users.append("group_notification")
-                messages.append(chat.strip())
-
-            dates.append(date_obj)
-            times.append(time_obj)
-
-        except Exception:
+def detect_date_order(dates):
+    """ Decide once per file whether dates are day-first or month-first """
+
+    if dates.empty:
+        return True
+
+    parts = dates.str.split('/', n=2, expand=True)
+    first = pd.to_numeric(parts[0], errors='coerce')
+    second = pd.to_numeric(parts[1], errors='coerce')
+
+    # A component above 12 can only be a day; default to day-first like before
+    if (first > 12).any():
+        return True
+    if (second > 12).any():
+        return False
+    return True
+
+
+def take_parsed(parsed, codes, index):
+    """ Expand values parsed per distinct string back to one value per row """
+
+    values = parsed.to_numpy()[codes]
+    values[codes == -1] = np.datetime64('NaT')
+    return pd.Series(values, index=index)
+
+
+def parse_dates(dates, dialect=None):
+    """ Parse all date strings of a file in a few columnar to_datetime calls """
+
+    index = dates.index
+
+    # Exports repeat the same few thousand dates, so only the distinct strings are parsed
+    codes, uniques = pd.factorize(dates)
+    dates = pd.Series(uniques, dtype=object).str.strip()
+
+    if dialect is not None:
+        dayfirst = dialect.dayfirst if dialect.dayfirst is not None else detect_date_order(dates)
+        date_format, _ = dialect_formats(dialect, dayfirst)
+        parsed = pd.to_datetime(dates, format=date_format, errors='coerce')
+        return take_parsed(parsed, codes, index)
+
+    dayfirst = detect_date_order(dates)
+    short_year = dates.str.len() - dates.str.rfind('/') <= 3
+
+    day_month = '%d/%m' if dayfirst else '%m/%d'
+    month_day = '%m/%d' if dayfirst else '%d/%m'
+
+    parsed = pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]')
+    for year_fmt, mask in (('%y', short_year), ('%Y', ~short_year)):
+        if not mask.any():
             continue
+        chunk = dates[mask]
+        result = pd.to_datetime(chunk, format=f"{day_month}/{year_fmt}", errors='coerce')
+
+        # Same fallback dateutil applied per line: swap day and month when the first order is invalid
+        failed = result.isna()
+        if failed.any():
+            result[failed] = pd.to_datetime(chunk[failed], format=f"{month_day}/{year_fmt}", errors='coerce')
+        parsed[mask] = result
+
+    return take_parsed(parsed, codes, index)
+
+
+def parse_times(times, dialect=None):
+    """ Parse all time strings of a file, one to_datetime call per time format present """
+
+    index = times.index
+    codes, uniques = pd.factorize(times)
+    times = pd.Series(uniques, dtype=object)
+
+    if dialect is not None:
+        _, time_format = dialect_formats(dialect, True)
+        parsed = pd.to_datetime(times, format=time_format, errors='coerce')
+        return take_parsed(parsed, codes, index)
+
+    times = times.str.replace('\u202f', ' ', regex=False).str.strip()
+    twelve_hour = times.str.contains(r'[APMapm]', regex=True)
+    with_seconds = times.str.count(':') == 2
+
+    formats = {
+        (True, True): '%I:%M:%S %p',
+        (True, False): '%I:%M %p',
+        (False, True): '%H:%M:%S',
+        (False, False): '%H:%M',
+    }
+
+    parsed = pd.Series(pd.NaT, index=times.index, dtype='datetime64[ns]')
+    for (is_12h, has_seconds), fmt in formats.items():
+        mask = (twelve_hour == is_12h) & (with_seconds == has_seconds)
+        if mask.any():
+            parsed[mask] = pd.to_datetime(times[mask], format=fmt, errors='coerce')
+
+    return take_parsed(parsed, codes, index)
+
+
+def split_messages(text, dialect):
+    """ Cut text at line-start timestamp headers into date, time and chat lists """
+
+    # One regex split, continuation lines stay inside the chat text of their message
+    # parts = [preamble, date, time, chat, date, time, chat, ...]
+    parts = header_pattern(dialect).split(text)
+
+    return parts[1::3], parts[2::3], parts[3::3]
+
+
+def parse_block(text, dialect):
+    """ Split a block of export text into raw columns, timestamps are left as categorical strings """
+
+    dates, times, chats = split_messages(text, dialect)
+
+    raw = pd.DataFrame({'date': dates, 'time': times}, dtype=object)
+    chats = pd.Series(chats, dtype=object).str.strip()
+
+    # Split "user: message", lines without a colon are group notifications.
+    # Only the first line counts, a continuation line may contain a colon of its own
+    parts = chats.str.partition(':').reindex(columns=range(3)).astype(object)
+    has_user = (parts[1] == ':') & ~parts[0].str.contains('\n', regex=False)
+
+    # A colon inside a notification splits it too; the names are scanned once each
+    codes, names = pd.factorize(parts[0])
+    not_a_name = np.array([NOT_A_NAME.search(name) is not None for name in names] + [False], dtype=bool)
+    has_user &= ~not_a_name[codes]
+
+    users = parts[0].str.strip().where(has_user, "group_notification")
+    messages = parts[2].str.strip().where(has_user, chats)
+    del parts, chats
+
+    # System events are attributed to group_notification, whoever the line names
+    events = classify_events(messages, has_user, dialect is None or dialect.platform == 'ios')
+    users = users.mask(events != 'message', "group_notification")
+
+    kinds, flags = classify_content(messages)
+
+    keep = ~(has_user & (users.str.lower() == "meta ai"))
+
+    block = pd.DataFrame({
+        'user': users[keep].astype('category'),
+        'message': messages[keep],
+        'event_type': events[keep.to_numpy()],
+        'content_kind': kinds[keep.to_numpy()],
+        'date': raw['date'][keep].astype('category'),
+        'time': raw['time'][keep].astype('category')
+    })
+    block[CONTENT_FLAGS] = flags[keep]
+
+    return block.reset_index(drop=True)
+
+
+def concat_blocks(blocks):
+    """ Join parsed blocks in order, merging the categorical date/time columns without expanding them """
+
+    raw = pd.DataFrame({
+        column: pd.concat([block[column] for block in blocks], ignore_index=True)
+        for column in ['message', 'event_type', 'content_kind'] + CONTENT_FLAGS
+    })
+    raw['user'] = union_categoricals([block['user'] for block in blocks], sort_categories=True)
+    raw['date'] = union_categoricals([block['date'] for block in blocks])
+    raw['time'] = union_categoricals([block['time'] for block in blocks])
+
+    return raw
+
+
+def finalize(raw, dialect):
+    """ Parse the timestamps of the raw columns and build the compact message frame """
+
+    # Settle a date order the sniffed sample left open on the whole file
+    if dialect is not None and dialect.dayfirst is None:
+        dialect = dialect._replace(dayfirst=detect_date_order(pd.Series(raw['date'].cat.categories, dtype=object)))
+
+    dates = parse_dates(raw['date'], dialect)
+    times = parse_times(raw['time'], dialect)
+
+    keep = dates.notna() & times.notna()
+
+    # Times are parsed on 1900-01-01, add their offset into the day to the date
+    timestamps = dates[keep] + (times[keep] - pd.Timestamp('1900-01-01'))
 
     # Create dataframe
     df = pd.DataFrame({
-        'user': users,
-        'message': messages,
-        'date': dates,
-        'time': times
-    })
+        'user': raw['user'][keep].cat.remove_unused_categories(),
+        'message': raw['message'][keep],
+        'event_type': raw['event_type'][keep],
+        'timestamp': timestamps,
+        'content_kind': raw['content_kind'][keep]
+    }).reset_index(drop=True)
 
-    # Extract components
-    df['year'] = df['date'].dt.year
-    df['month'] = df['date'].dt.month_name()
-    df['day'] = df['date'].dt.day.astype(str).str.zfill(2)
-    df['hour'] = pd.to_datetime(df['time'].astype(str), format='%H:%M:%S').dt.hour.astype(str).str.zfill(2)
-    df['minute'] = pd.to_datetime(df['time'].astype(str), format='%H:%M:%S').dt.minute.astype(str).str.zfill(2)
+    # Extract components as small integers (weekday: Monday=0)
+    stamp = df['timestamp'].dt
+    df['year'] = stamp.year.astype('int16')
+    df['month'] = stamp.month.astype('int8')
+    df['day'] = stamp.day.astype('int8')
+    df['hour'] = stamp.hour.astype('int8')
+    df['minute'] = stamp.minute.astype('int8')
+    df['weekday'] = stamp.weekday.astype('int8')
+    df[CONTENT_FLAGS] = raw[CONTENT_FLAGS][keep].to_numpy()
 
-    df = update_ios_system_messages(df)
+    # Recorded so that a later export of the same chat can be read with the same date order
+    if dialect is not None:
+        df.attrs['dayfirst'] = dialect.dayfirst
 
     # Final preprocessing component, uses googleTrans to translate messages to English for sentiment analysis
     # df['translated_msg'] = df['message'].apply(translate_message) 
@@ -128,3 +463,162 @@ def preprocess(data):
 
     return df
 
+
+def append_messages(head, tail):
+    """ Frame of head followed by tail, both returned by preprocess, with a single user categorical """
+
+    df = pd.concat([head, tail], ignore_index=True)
+    df['user'] = union_categoricals([head['user'], tail['user']])
+
+    return df
+
+
+def legacy_schema(df):
+    """ Frame with the columns preprocess returned before the compact schema, for older callers """
+
+    stamp = df['timestamp'].dt
+
+    legacy = pd.DataFrame({
+        'user': df['user'].astype(object),
+        'message': df['message'],
+        'date': stamp.normalize(),
+        'time': stamp.time
+    })
+    legacy['year'] = df['year'].astype('int32')
+    legacy['month'] = stamp.month_name()
+    for column in ('day', 'hour', 'minute'):
+        legacy[column] = df[column].astype(str).str.zfill(2)
+
+    return legacy
+
+
+def shard_text(data, shards, dialect):
+    """ Cut text into roughly equal shards that each start at a message header """
+
+    pattern = header_pattern(dialect)
+    bounds = [0]
+
+    for i in range(1, shards):
+        match = pattern.search(data, max(len(data) * i // shards, bounds[-1]))
+        if match is None:
+            break
+        bounds.append(match.start())
+
+    bounds.append(len(data))
+
+    return [data[start:end] for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def parse_parallel(data, dialect, workers):
+    """ Parse shards of the text in worker processes, blocks come back in file order """
+
+    shards = shard_text(data, workers, dialect)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        blocks = list(pool.map(parse_block, shards, repeat(dialect)))
+
+    return concat_blocks(blocks) if blocks else parse_block('', dialect)
+
+
+def preprocess(data, dialect=None, workers=1, parallel_threshold=PARALLEL_THRESHOLD):
+    # Detect the export layout once; pass a dialect to reuse one detected earlier
+    if dialect is None:
+        dialect = sniff_format(data)
+
+    # Opt-in: shard large exports over a process pool (workers=None uses every core)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers > 1 and len(data) >= parallel_threshold:
+        raw = parse_parallel(data, dialect, workers)
+    else:
+        raw = parse_block(data, dialect)
+
+    return finalize(raw, dialect)
+
+
+def split_complete(text, dialect):
+    """ Split text before its last message header, that message may continue in the next chunk """
+
+    pattern = header_pattern(dialect)
+    end = len(text)
+
+    # Walk line starts backwards, usually only one or two lines
+    while True:
+        start = text.rfind('\n', 0, end) + 1
+        if pattern.match(text, start):
+            return text[:start], text[start:]
+        if start == 0:
+            return '', text
+        end = start - 1
+
+
+def preprocess_stream(stream, chunk_size=CHUNK_SIZE, dialect=None, workers=1, parallel_threshold=PARALLEL_THRESHOLD):
+    """
+    Parse a binary export stream chunk by chunk instead of decoding the whole file at once.
+    Only one chunk's intermediates are alive at a time, but the parsed columns still grow with
+    the file: a 1M-line (59 MB) export peaks at about 200 MB, 1.8x the 111 MB frame it returns.
+    With workers > 1, chunks past the first parallel_threshold bytes are parsed in a process pool
+    """
+
+    # Opt-in, like preprocess: workers=None uses every core
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    sniffed = dialect is not None
+    blocks = []
+    carry = ''
+    read = 0
+    pool = None
+    pending = deque()
+
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            read += len(chunk)
+            text = carry + decoder.decode(chunk, final=not chunk)
+
+            if not sniffed:
+                dialect = sniff_format(text)
+                sniffed = True
+
+            # The last message may be cut by the chunk boundary, it is completed by the next chunk
+            if chunk:
+                text, carry = split_complete(text, dialect)
+
+            # Small exports never pay for starting the pool
+            if pool is None and workers > 1 and read >= parallel_threshold:
+                pool = ProcessPoolExecutor(max_workers=workers)
+
+            if text and pool is not None:
+                pending.append(len(blocks))
+                blocks.append(pool.submit(parse_block, text, dialect))
+                # A few chunks in flight per worker, so the unparsed text stays bounded
+                while len(pending) > 2 * workers:
+                    index = pending.popleft()
+                    blocks[index] = blocks[index].result()
+            elif text:
+                blocks.append(parse_block(text, dialect))
+            # Only the parsed block outlives the chunk. pandas' cached .str accessors tie every
+            # intermediate Series into a reference cycle, collect them before the next chunk
+            del text
+            gc.collect()
+
+            if not chunk:
+                break
+
+        for index in pending:
+            blocks[index] = blocks[index].result()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if not blocks:
+        blocks.append(parse_block('', dialect))
+
+    # Release the per-chunk frames before the timestamp columns are built
+    raw = concat_blocks(blocks)
+    del blocks
+
+    return finalize(raw, dialect)
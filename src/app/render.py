@@ -0,0 +1,164 @@
+import io
+import os
+import sys
+import threading
+from contextlib import contextmanager
+import matplotlib.pyplot as plt
+import streamlit as st
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# Streamlit dark theme background
+STREAMLIT_BG = '#0E1117'
+
+# Dark theme every chart is drawn under: transparent figure, dark axes, white
+# bottom/left spines and ticks, no top/right spines
+DARK_STYLE = {
+    'figure.facecolor': 'none',
+    'figure.edgecolor': 'none',
+    'axes.facecolor': STREAMLIT_BG,
+    'axes.edgecolor': 'white',
+    'axes.labelcolor': 'white',
+    'axes.spines.top': False,
+    'axes.spines.right': False,
+    'xtick.color': 'white',
+    'ytick.color': 'white',
+}
+
+# savefig options per format; PNGs match what st.pyplot rendered
+SAVE_OPTIONS = {
+    'png': {'dpi': 200, 'bbox_inches': 'tight'},
+    'svg': {'bbox_inches': 'tight'},
+}
+
+
+def current_rss():
+    """ Resident set size of this process in bytes, the peak where the current one cannot be read """
+
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if resource is None:
+        return None
+
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class FigureTracker:
+    """
+    Lifecycle of every matplotlib figure the dashboard draws.
+
+    Figures opened while a chart is drawn are closed as soon as it is rendered,
+    including ones a chart opened but did not return, and the counters show
+    how many were created, how many are still open and how many bytes went out.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # pyplot keeps global state, so sessions draw one chart at a time
+        self.drawing = threading.RLock()
+        self.figures_created = 0
+        self.charts_rendered = 0
+        self.bytes_rendered = 0
+
+    @contextmanager
+    def track(self):
+        """ Close every figure opened inside the block when it ends """
+
+        with self.drawing:
+            before = set(plt.get_fignums())
+            try:
+                yield
+            finally:
+                opened = set(plt.get_fignums()) - before
+                for number in opened:
+                    plt.close(number)
+                with self.lock:
+                    self.figures_created += len(opened)
+
+    def rendered(self, image):
+        with self.lock:
+            self.charts_rendered += 1
+            self.bytes_rendered += len(image)
+
+    def snapshot(self):
+        """ Counters of the whole server process """
+
+        with self.lock:
+            return {
+                'figures_created': self.figures_created,
+                'figures_open': len(plt.get_fignums()),
+                'charts_rendered': self.charts_rendered,
+                'bytes_rendered': self.bytes_rendered,
+                'rss': current_rss(),
+            }
+
+
+tracker = FigureTracker()
+
+
+def save(fig, fmt="png"):
+    """ fig rendered to PNG or SVG bytes """
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, **SAVE_OPTIONS[fmt])
+    image = buffer.getvalue()
+    tracker.rendered(image)
+
+    return image
+
+
+def render(func, fmt="png", **kwargs):
+    """
+    func(**kwargs) drawn under the dark style and rendered once, None when it draws nothing;
+    every figure it opened is closed before this returns
+    """
+
+    with tracker.track(), plt.style.context(DARK_STYLE):
+        fig = func(**kwargs)
+
+        if fig is None:
+            return None
+
+        return save(fig, fmt)
+
+
+def show(image, use_container_width=True):
+    """ Put a rendered chart on the page; charts with nothing to draw are left out """
+
+    if image is None:
+        return
+
+    if isinstance(image, bytes) and image.lstrip().startswith(b"<"):
+        st.image(image.decode(), use_container_width=use_container_width)
+    else:
+        st.image(image, use_container_width=use_container_width)
+
+
+def debug_panel():
+    """ Sidebar panel with the render counters and this session's peak RSS, shown with ?debug=1 """
+
+    if st.query_params.get("debug") != "1":
+        return
+
+    stats = tracker.snapshot()
+    if stats['rss'] is not None:
+        st.session_state["peak_rss"] = max(st.session_state.get("peak_rss", 0), stats['rss'])
+
+    with st.sidebar.expander("Render stats", expanded=True):
+        st.metric("Figures created", stats['figures_created'])
+        st.metric("Figures open", stats['figures_open'])
+        st.metric("Charts rendered", stats['charts_rendered'])
+        st.metric("Bytes rendered", f"{stats['bytes_rendered'] / 2**20:.1f} MB")
+        if stats['rss'] is not None:
+            st.metric("RSS", f"{stats['rss'] / 2**20:.0f} MB")
+            st.metric("Peak RSS (session)", f"{st.session_state['peak_rss'] / 2**20:.0f} MB")
@@ -0,0 +1,104 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import chat_stats
+
+
+# Longest runs of consecutive active days and longest gaps between active days,
+# each as a frame of start, end and days sorted longest first
+Streaks = namedtuple('Streaks', ['longest_active', 'longest_inactive', 'active', 'inactive'])
+
+TOP_K = 5
+
+
+def day_pairs(df):
+    """ Sorted, distinct (user, day) pairs as two arrays; every row also counts once for "Overall" """
+
+    days = df['timestamp'].values.astype('datetime64[D]').astype(np.int64)
+    codes, users = pd.factorize(df['user'].astype(str), sort=True)
+    users = list(users) + ["Overall"]
+
+    if len(days) == 0:
+        return users, np.empty(0, np.int64), np.empty(0, np.int64)
+
+    first = days.min()
+    width = days.max() - first + 1
+
+    # One sortable key per (user, day) lets np.unique sort and deduplicate both at once
+    keys = np.concatenate([codes.astype(np.int64), np.full(len(days), len(users) - 1)]) * width
+    keys += np.concatenate([days, days]) - first
+    keys = np.unique(keys)
+
+    return users, keys // width, keys % width + first
+
+
+def empty_runs():
+    return pd.DataFrame({'start': pd.Series(dtype='datetime64[s]'), 'end': pd.Series(dtype='datetime64[s]'),
+                         'days': pd.Series(dtype='int64')})
+
+
+def top_runs(owner, start, end, length, users, top_k):
+    """ Per-user frames of the top_k longest runs, and each user's longest length """
+
+    runs = pd.DataFrame({
+        'owner': owner,
+        'start': start.astype('datetime64[D]'),
+        'end': end.astype('datetime64[D]'),
+        'days': length,
+    })
+    runs = runs.sort_values(['owner', 'days', 'start'], ascending=[True, False, True], kind='stable')
+    best = runs.groupby('owner').head(top_k)
+
+    frames = {users[code]: group.drop(columns='owner').reset_index(drop=True)
+              for code, group in best.groupby('owner')}
+    longest = {users[code]: int(group['days'].iloc[0]) for code, group in best.groupby('owner')}
+
+    return frames, longest
+
+
+def activity_streaks(df, top_k=TOP_K):
+    """ Active and inactive streaks of every user and "Overall" from one pass over the day ordinals """
+
+    users, owner, day = day_pairs(df)
+
+    # A run starts wherever the user changes or the previous active day is not yesterday
+    steps = np.diff(day)
+    same_user = owner[1:] == owner[:-1]
+    new_run = np.ones(len(day), dtype=bool)
+    new_run[1:] = ~same_user | (steps != 1)
+
+    starts = np.flatnonzero(new_run)
+    lengths = np.diff(np.append(starts, len(day)))
+    active, longest_active = top_runs(owner[starts], day[starts], day[starts + lengths - 1], lengths, users, top_k)
+
+    # A gap's rows count its idle days, start to end; the longest inactive streak keeps being
+    # measured like a date difference: active on the 1st and the 5th is 3 idle days, a streak of 4
+    gap = same_user & (steps > 1)
+    inactive, longest_idle = top_runs(owner[1:][gap], day[:-1][gap] + 1, day[1:][gap] - 1, steps[gap] - 1, users, top_k)
+    longest_inactive = {user: days + 1 for user, days in longest_idle.items()}
+
+    empty = empty_runs()
+
+    return {
+        user: Streaks(
+            longest_active.get(user, 1),
+            longest_inactive.get(user, 0),
+            active.get(user, empty),
+            inactive.get(user, empty),
+        )
+        for user in users
+    }
+
+
+def streaks_for(df):
+    """ activity_streaks of a parsed chat, computed once per chat """
+
+    return chat_stats.derived(df, 'streaks', activity_streaks)
+
+
+def user_streaks(user, df):
+    """ Streaks of one user or "Overall"; a user with no messages has a one-day active streak, as before """
+
+    empty = empty_runs()
+
+    return streaks_for(df).get(user, Streaks(1, 0, empty, empty))
@@ -0,0 +1,211 @@
+import re
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+
+# Words inside a token, the definition unique_words_used has always counted
+WORD_PATTERN = re.compile(r'\w+')
+
+# Messages tokenized per batch, bounds the Python lists alive at once
+BATCH_SIZE = 100_000
+
+
+class TokenIndex:
+    """
+    Whitespace tokens of every message of a chat, lowercased and interned once.
+
+    vocabulary[i] is the token with id i. The ids of message m are
+    ids[offsets[m]:offsets[m + 1]] (int32, CSR layout) and counts[m] (int32)
+    is its number of tokens, the word count every statistic uses.
+    """
+
+    def __init__(self, vocabulary, ids, offsets):
+        self.vocabulary = vocabulary
+        self.ids = ids
+        self.offsets = offsets
+        self.counts = np.diff(offsets).astype(np.int32)
+        self.parts = None
+
+    @classmethod
+    def from_messages(cls, messages):
+        values = messages.astype(str).tolist()
+        interned = {}
+        ids, counts = [], []
+
+        for start in range(0, len(values), BATCH_SIZE):
+            batch = [value.lower().split() for value in values[start:start + BATCH_SIZE]]
+            counts.append(np.fromiter(map(len, batch), np.int64, len(batch)))
+
+            # Tokens are hashed in C per batch, only the batch's distinct tokens touch the Python dict
+            codes, uniques = pd.factorize(pd.Series(list(chain.from_iterable(batch)), dtype=object))
+            mapping = np.fromiter((interned.setdefault(token, len(interned)) for token in uniques),
+                                  np.int32, len(uniques))
+            ids.append(mapping[codes])
+
+        counts = np.concatenate(counts) if counts else np.empty(0, np.int64)
+        offsets = np.zeros(len(counts) + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return cls(
+            np.array(list(interned), dtype=object),
+            np.concatenate(ids) if ids else np.empty(0, np.int32),
+            offsets,
+        )
+
+    def token_rows(self, rows):
+        """ Mask over ids of the tokens belonging to the messages selected by a boolean row mask """
+
+        return np.repeat(np.asarray(rows, dtype=bool), self.counts)
+
+    def token_counts(self, rows=None):
+        """ Occurrences of every vocabulary id, over all messages or the masked ones """
+
+        ids = self.ids if rows is None else self.ids[self.token_rows(rows)]
+        return np.bincount(ids, minlength=len(self.vocabulary))
+
+    def map_vocabulary(self, func):
+        """ func(token) for every vocabulary token, interned: (term id per token id, terms) """
+
+        codes, terms = pd.factorize(pd.Series([func(token) for token in self.vocabulary], dtype=object))
+        return codes.astype(np.int32), np.asarray(terms, dtype=object)
+
+    def word_parts(self):
+        """
+        The \\w+ words of every vocabulary token in CSR layout: (part_offsets, part_ids, words),
+        words of token i are words[part_ids[part_offsets[i]:part_offsets[i + 1]]]
+        """
+
+        if self.parts is None:
+            found = [WORD_PATTERN.findall(token) for token in self.vocabulary]
+            lengths = np.fromiter(map(len, found), np.int64, len(found))
+            part_offsets = np.zeros(len(found) + 1, np.int64)
+            np.cumsum(lengths, out=part_offsets[1:])
+            part_ids, words = pd.factorize(pd.Series(list(chain.from_iterable(found)), dtype=object))
+            self.parts = (part_offsets, part_ids.astype(np.int32), np.asarray(words, dtype=object))
+
+        return self.parts
+
+    def user_words(self, user_codes):
+        """ Distinct (user code, word id) pairs of the messages, plus the word strings """
+
+        part_offsets, part_ids, words = self.word_parts()
+
+        # Distinct tokens per user first, far fewer than token occurrences
+        token_users = np.repeat(np.asarray(user_codes, dtype=np.int64), self.counts)
+        width = max(len(self.vocabulary), 1)
+        pairs = np.unique(token_users * width + self.ids)
+        users, token_ids = pairs // width, pairs % width
+
+        # Expand every token into its words, then deduplicate per user again
+        part_counts = np.diff(part_offsets)[token_ids]
+        starts = np.repeat(part_offsets[token_ids] - np.cumsum(part_counts) + part_counts, part_counts)
+        word_ids = part_ids[starts + np.arange(part_counts.sum())]
+        width = max(len(words), 1)
+        pairs = np.unique(np.repeat(users, part_counts) * width + word_ids)
+
+        return pairs // width, pairs % width, words
+
+
+class TermMatrix:
+    """
+    Sparse user × term count matrix in CSR layout, plain numpy.
+
+    Row r belongs to users[r]; its term ids are indices[indptr[r]:indptr[r + 1]], sorted,
+    with their counts in data. terms[i] is the string of term id i, and ids follow first
+    appearance in the chat so ties keep the order Counter.most_common would give.
+    """
+
+    def __init__(self, users, terms, indptr, indices, data):
+        self.users = users
+        self.terms = terms
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.rows = {user: i for i, user in enumerate(users)}
+
+    @classmethod
+    def from_tokens(cls, index, user_codes, users, term_ids, terms, overall=None):
+        """
+        Count terms per user from a TokenIndex. term_ids maps vocabulary ids to terms (-1 drops
+        the token); when overall masks users, their summed row is added as "Overall".
+        """
+
+        token_terms = term_ids[index.ids]
+        token_users = np.repeat(np.asarray(user_codes, dtype=np.int64), index.counts)
+        kept = token_terms >= 0
+
+        width = max(len(terms), 1)
+        keys, data = np.unique(token_users[kept] * width + token_terms[kept], return_counts=True)
+        rows, indices = keys // width, (keys % width).astype(np.int32)
+
+        users = list(users)
+        if overall is not None:
+            # Summing the rows is cheaper than counting the tokens again
+            people = np.asarray(overall, dtype=bool)[rows]
+            totals = np.bincount(indices[people], weights=data[people], minlength=len(terms))
+            present = np.flatnonzero(totals)
+            rows = np.concatenate([rows, np.full(len(present), len(users))])
+            indices = np.concatenate([indices, present.astype(np.int32)])
+            data = np.concatenate([data, totals[present].astype(data.dtype)])
+            users.append("Overall")
+
+        indptr = np.searchsorted(rows, np.arange(len(users) + 1))
+
+        return cls(users, terms, indptr, indices, data)
+
+    def row(self, user):
+        """ (term ids, counts) of one user, empty when the user has no terms """
+
+        r = self.rows.get(user)
+        if r is None:
+            return np.empty(0, np.int32), np.empty(0, self.data.dtype)
+
+        return self.indices[self.indptr[r]:self.indptr[r + 1]], self.data[self.indptr[r]:self.indptr[r + 1]]
+
+    def unique_terms(self, user):
+        r = self.rows.get(user)
+        return 0 if r is None else int(self.indptr[r + 1] - self.indptr[r])
+
+    def top_terms(self, user, n=50):
+        """ The n most used terms of a user as {term: count} """
+
+        ids, counts = self.row(user)
+        top = np.lexsort((ids, -counts))[:n]
+
+        return dict(zip(self.terms[ids[top]], counts[top].tolist()))
+
+    def distinctive_terms(self, user, n=10):
+        """
+        The n terms scoring highest by TF-IDF of the user's row against every other
+        row but "Overall"; terms every user says score zero and are left out
+        """
+
+        people = [r for u, r in self.rows.items() if u != "Overall"]
+        ids, counts = self.row(user)
+        if user == "Overall" or len(ids) == 0 or len(people) < 2:
+            return {}
+
+        spans = [np.arange(self.indptr[r], self.indptr[r + 1]) for r in people]
+        doc_freq = np.bincount(self.indices[np.concatenate(spans)], minlength=len(self.terms))
+
+        scores = counts / counts.sum() * np.log(len(people) / doc_freq[ids])
+        top = np.lexsort((ids, -scores))[:n]
+        top = top[scores[top] > 0]
+
+        return dict(zip(self.terms[ids[top]], scores[top].tolist()))
+
+    def overlap(self, user_a, user_b):
+        """ Shared and exclusive term counts of two users, with the Jaccard index of their vocabularies """
+
+        a, _ = self.row(user_a)
+        b, _ = self.row(user_b)
+        shared = len(np.intersect1d(a, b, assume_unique=True))
+        union = len(a) + len(b) - shared
+
+        return {
+            'shared': shared,
+            'only_a': len(a) - shared,
+            'only_b': len(b) - shared,
+            'jaccard': shared / union if union else 0.0,
+        }
@@ -1,12 +1,19 @@
 import streamlit as st
-import preprocessor, helper
+import helper
+import chat_cache
+import memo
 import animation
 import draw  
+import render
+import interactive
 import time
-from wordCloud import plot_wordCloud
+from wordCloud import plot_wordCloud, precompute_wordclouds
 import seaborn as sns
 import helper
 
+# Set once "Show Insights" is clicked
+ANALYZE_KEY = "show_insights"
+
 
 def get_user_colors(user_counts):
     users = list(user_counts.keys())
@@ -45,11 +52,16 @@ def setPageConfig():
 
 
 def user_selection_sidebar(df):
-    user_list = helper.extract_users(df)
+    user_list = memo.metric(helper.extract_users, df)
     selected_user = st.sidebar.selectbox("Select participant", user_list, key="user_selector")
-    analyze = st.sidebar.button("Show Insights")
+    interactive.backend_toggle()
+
+    # A button is only True on the run it was clicked in; remembering the click keeps
+    # the insights up when a toggle on the page reruns the script
+    if st.sidebar.button("Show Insights"):
+        st.session_state[ANALYZE_KEY] = True
 
-    return selected_user, analyze
+    return selected_user, st.session_state.get(ANALYZE_KEY, False)
 
 
 
@@ -59,11 +71,23 @@ def upload_and_preprocess_chat():
     uploaded_file = st.sidebar.file_uploader("Choose a file")
 
     if uploaded_file is not None:
-        bytes_data = uploaded_file.getvalue()
-        data = bytes_data.decode("utf-8")
         st.sidebar.success("File uploaded successfully!")
 
-        df = preprocessor.preprocess(data)
+        # Reruns of the same upload reuse the frame parsed for this session
+        parsed = st.session_state.get("parsed_chat")
+        if parsed is not None and parsed[0] == uploaded_file.file_id:
+            return parsed[1]
+
+        # Parsed chats and their per-user stats are cached on disk by content hash, so re-uploads
+        # skip parsing and newer exports of a cached chat only parse their new messages
+        df = chat_cache.load_or_parse(uploaded_file)
+        st.session_state["parsed_chat"] = (uploaded_file.file_id, df)
+        # A new chat waits for "Show Insights" again
+        st.session_state.pop(ANALYZE_KEY, None)
+
+        # Word cloud layout is the slowest part of the page; every participant's cloud is
+        # rendered in the background while the first sections are read
+        precompute_wordclouds(df, memo.metric(helper.extract_users, df))
         # st.write(df.columns.tolist())
         # st.dataframe(df)
         return df
@@ -74,8 +98,8 @@ def upload_and_preprocess_chat():
 def basic_statistics(df, selected_user):
 
     if selected_user == "Overall":
-        group_created_date = helper.group_created(df)
-        participants = helper.member_count(df)
+        group_created_date = memo.metric(helper.group_created, df)
+        participants = memo.metric(helper.member_count, df)
         formatted_date = group_created_date.strftime("%d %B %Y") if group_created_date else "Not Available"
 
         group_age = time.time() - group_created_date.timestamp() if group_created_date else 0
@@ -99,16 +123,16 @@ def basic_statistics(df, selected_user):
         setGap()
 
     # Shared: Metrics Section
-    avg_len = helper.avg_msg_length(selected_user, df)
-    longest_msg = helper.longest_message(selected_user, df)
-    wordstock = helper.unique_words_used(selected_user, df)
+    avg_len = memo.metric(helper.avg_msg_length, df, user=selected_user)
+    longest_msg = memo.metric(helper.longest_message, df, user=selected_user)
+    wordstock = memo.metric(helper.unique_words_used, df, user=selected_user)
 
     col1, col2, col3, col4 = st.columns(4)
 
-    total_messages = helper.messages_sent(selected_user, df)
-    total_words = helper.words_typed(selected_user, df)
-    total_links = helper.links_shared(selected_user, df)
-    total_media = helper.media_shared(selected_user, df)
+    total_messages = memo.metric(helper.messages_sent, df, user=selected_user)
+    total_words = memo.metric(helper.words_typed, df, user=selected_user)
+    total_links = memo.metric(helper.links_shared, df, user=selected_user)
+    total_media = memo.metric(helper.media_shared, df, user=selected_user)
 
     metric_data = [
         (col1, "Text Messages Sent", total_messages),
@@ -127,18 +151,22 @@ def basic_statistics(df, selected_user):
 
     # Emoji section
     st.markdown("#### Emojis Used")
-    emoji_stats = helper.emojis_used(selected_user, df)
+    emoji_stats = memo.metric(helper.emojis_used, df, user=selected_user)
     #print(helper.emojis_used(selected_user, df))
     col1, col2 = st.columns(2)
     animation.numerical_metrics([(col1, "Total Emojis Used", emoji_stats['total_emojis_used'])])
 
     col2.metric("Most Used Emoji", emoji_stats['most_used_emoji'])
+
+    top_emojis = memo.metric(helper.top_emojis, df, user=selected_user)
+    if not top_emojis.empty:
+        st.dataframe(top_emojis, hide_index=True)
     setGap()
 
 
 
 def user_analysis(df, selected_user):
-    file_has_media = helper.is_media_included(df)
+    file_has_media = memo.metric(helper.is_media_included, df)
 
     if selected_user == "Overall":
         # -------------------------
@@ -151,14 +179,17 @@ def user_analysis(df, selected_user):
         # Column 1: Bar chart
         with col1:
             st.markdown("#### Top Active Users")
-            fig1 = draw.top_active_users_plot(df)
-            st.pyplot(fig1)
+            if interactive.enabled():
+                interactive.show(interactive.participants_chart(df))
+            else:
+                fig1 = memo.chart(draw.top_active_users_plot, df)
+                render.show(fig1)
 
         # Column 2: Pie chart
         with col2:
             st.markdown("#### Text Messages Distribution (%)")
-            fig2 = draw.distribution_chart(df, "messages")
-            st.pyplot(fig2)
+            fig2 = memo.chart(draw.distribution_chart, df, metric="messages")
+            render.show(fig2)
 
 
         # Second Row: media and link distributions
@@ -167,14 +198,14 @@ def user_analysis(df, selected_user):
         with col3:
             setGap()
             st.markdown("#### Media Distribution (%)")
-            fig3 = draw.distribution_chart(df, "media")
-            st.pyplot(fig3)
+            fig3 = memo.chart(draw.distribution_chart, df, metric="media")
+            render.show(fig3)
 
         with col4:
             setGap()
             st.markdown("#### Links Distribution (%)")
-            fig4 = draw.distribution_chart(df, "links")
-            st.pyplot(fig4)
+            fig4 = memo.chart(draw.distribution_chart, df, metric="links")
+            render.show(fig4)
 
 
         # Media categorization, images, video, audio, doc + contact -> Third Row
@@ -185,13 +216,13 @@ def user_analysis(df, selected_user):
             with col5:
                 setGap()
                 st.markdown("#### Media Categorization")
-                fig5 = draw.plot_media_categorization(df, "Overall")
-                st.pyplot(fig5)
+                fig5 = memo.chart(draw.plot_media_categorization, df, selected_user="Overall")
+                render.show(fig5)
 
 
             with col6:
                 setGap()
-                image_count, video_count, audio_count, doc_count, contact_count = helper.count_media_docs_contacts(df, "Overall")
+                image_count, video_count, audio_count, doc_count, contact_count = memo.metric(helper.count_media_docs_contacts, df, selected_user="Overall")
 
                 setGap()
                 setGap()
@@ -209,13 +240,11 @@ def user_analysis(df, selected_user):
         # Individual user analysis
         # -------------------------
 
-        user_df = df[df["user"] == selected_user]
-
         # Row 1: Most Active Year, Month, Day
         st.markdown("#### Most Active")
         col1, col2, col3 = st.columns(3)
 
-        most_year, most_month, most_day = helper.most_active_times(user_df)
+        most_year, most_month, most_day = memo.metric(helper.most_active_times, df, user=selected_user)
         most_day = most_day.strftime("%d %B %Y")
 
 
@@ -241,13 +270,13 @@ def user_analysis(df, selected_user):
             with col4:
                 setGap()
                 st.markdown("#### Media Categorization")
-                fig1 = draw.plot_media_categorization(df, selected_user)
-                st.pyplot(fig1)
+                fig1 = memo.chart(draw.plot_media_categorization, df, selected_user=selected_user)
+                render.show(fig1)
 
             
             with col5:
                 setGap()
-                image_count, video_count, audio_count, doc_count, contact_count = helper.count_media_docs_contacts(df, selected_user)
+                image_count, video_count, audio_count, doc_count, contact_count = memo.metric(helper.count_media_docs_contacts, df, selected_user=selected_user)
 
                 setGap()
                 setGap()
@@ -268,56 +297,58 @@ def user_analysis(df, selected_user):
 
         with col6:
             st.markdown("#### Yearly Activity")
-            fig1 = draw.yearly_message_count_plot(user_df)
-            st.pyplot(fig1)
+            fig1 = memo.chart(draw.yearly_message_count_plot, df, selected_user=selected_user)
+            render.show(fig1)
 
         with col7:
             st.markdown("#### Monthly Activity")
-            fig2 = draw.monthly_message_count_plot(user_df)
-            st.pyplot(fig2)
+            fig2 = memo.chart(draw.monthly_message_count_plot, df, selected_user=selected_user)
+            render.show(fig2)
 
         with col8:
             st.markdown("#### Weekly Activity")
-            fig3 = draw.weekday_message_count_plot(user_df)
-            st.pyplot(fig3)      
+            fig3 = memo.chart(draw.weekday_message_count_plot, df, selected_user=selected_user)
+            render.show(fig3)      
 
 
 
 def temporal_activity(df, selected_user):
     if selected_user == "Overall":
         setGap()
-        overall_df = df[df['user'] != 'group_notification']
 
         col1, spacer1, col2, spacer2, col3 = st.columns([5, 1, 5, 1, 5])
 
         with col1:
             st.markdown("#### Yearly Activity")
-            fig1 = draw.yearly_message_count_plot(overall_df)
-            st.pyplot(fig1)
+            fig1 = memo.chart(draw.yearly_message_count_plot, df, selected_user="Overall")
+            render.show(fig1)
 
         with col2:
             st.markdown("#### Monthly Activity")
-            fig2 = draw.avg_monthly_message_count_plot(overall_df)
-            st.pyplot(fig2)
+            fig2 = memo.chart(draw.avg_monthly_message_count_plot, df, selected_user="Overall")
+            render.show(fig2)
 
         with col3:
             st.markdown("#### Weekly Activity")
-            fig3 = draw.avg_weekday_message_count_plot(overall_df)
-            st.pyplot(fig3)
+            fig3 = memo.chart(draw.avg_weekday_message_count_plot, df, selected_user="Overall")
+            render.show(fig3)
 
         setGap()
         st.markdown("#### Hourly Activity")
         setGap()
-        fig4 = draw.hourly_message_count_plot(overall_df)
-        st.pyplot(fig4)
+        if interactive.enabled():
+            interactive.show(interactive.hourly_chart(df, "Overall"))
+        else:
+            fig4 = memo.chart(draw.hourly_message_count_plot, df, selected_user="Overall")
+            render.show(fig4)
 
     else:
         col1, col2, col3, col4 = st.columns(4)
         
-        first_msg_date = helper.first_message_date(selected_user, df)
-        last_msg_date = helper.last_message_date(selected_user, df)
-        longest_active_streak = helper.longest_active_streak(selected_user, df)
-        longest_inactive_streak = helper.longest_inactive_streak(selected_user, df)
+        first_msg_date = memo.metric(helper.first_message_date, df, selected_user=selected_user)
+        last_msg_date = memo.metric(helper.last_message_date, df, selected_user=selected_user)
+        longest_active_streak = memo.metric(helper.longest_active_streak, df, selected_user=selected_user)
+        longest_inactive_streak = memo.metric(helper.longest_inactive_streak, df, selected_user=selected_user)
 
         # Format dates
         first_msg_str = first_msg_date.strftime("%d %B %Y") if first_msg_date else "N/A"
@@ -341,8 +372,11 @@ def temporal_activity(df, selected_user):
         setGap()
         st.markdown("#### Hourly Activity")
         setGap()
-        fig4 = draw.hourly_message_count_plot(df, selected_user)
-        st.pyplot(fig4)
+        if interactive.enabled():
+            interactive.show(interactive.hourly_chart(df, selected_user))
+        else:
+            fig4 = memo.chart(draw.hourly_message_count_plot, df, selected_user=selected_user)
+            render.show(fig4)
 
 
 
@@ -360,15 +394,16 @@ def concluding_analysis(df, selected_user):
             "**Note:** For clarity, response times exceeding 25 minutes are excluded from the plot. "
             "However, the true average may still be higher."
         )
-        rt_data = helper.response_times(df)
-        fig = draw.response_time_plot(rt_data["all_deltas"], rt_data["avg"])
-        st.pyplot(fig)
+        fig = memo.response_time_chart(df)
+        if fig is None:
+            st.write("No replies yet: every message so far follows one from the same sender.")
+        render.show(fig)
 
 
     with col2:
         st.markdown("##### Day vs Night Activity")
-        fig_pie = draw.plot_day_night_activity_pie(df, selected_user)
-        st.pyplot(fig_pie, use_container_width=True)
+        fig_pie = memo.chart(draw.plot_day_night_activity_pie, df, selected_user=selected_user)
+        render.show(fig_pie)
 
 
 
@@ -377,5 +412,9 @@ def chat_timeline(df):
     st.markdown("#### Chat Timeline")
     setGap()
 
-    fig = draw.plot_chat_timeline(df)
-    st.pyplot(fig)
\ No newline at end of file
+    if interactive.enabled():
+        interactive.show(interactive.timeline_chart(df))
+    else:
+        rolling = st.toggle("Rolling average")
+        fig = memo.chart(draw.plot_chat_timeline, df, rolling=rolling)
+        render.show(fig)
\ No newline at end of file
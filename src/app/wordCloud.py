@@ -1,10 +1,14 @@
+import io
 import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
 from wordcloud import WordCloud
 import re
 from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 import streamlit as st
-from draw import STREAMLIT_BG
+import chat_stats
+import tokens
+import render
 
 STOP_WORDS = {
     'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
@@ -22,6 +26,34 @@ STOP_WORDS = {
     'messages', 'endtoend', 'encrypted', 'chat', 'whatsapp', 'whats', 'app', 'whatsappchat', 'whatsappmessages', 'whatsappmessage',
 }
 
+# Shorter words are left out of word clouds and frequency tables
+MIN_WORD_LENGTH = 2
+
+# Removed before counting words, applied to lowercased text. Phone numbers need no pattern of
+# their own: the last alternative drops their digits without gluing the words around them together
+CLEAN_PATTERN = re.compile(
+    r"https?://\S+"         # URLs, up to the next whitespace
+    r"|\S+@\S+"            # e-mail addresses
+    r"|[^a-z\s]+"          # digits, punctuation, emoji
+)
+
+# Messages cleaned per batch by get_top_words
+CLEAN_BATCH = 10_000
+
+# Word cloud shown on the page; images are rendered at CLOUD_SCALE times this size
+CLOUD_PARAMS = {
+    'top_n': 100,
+    'width': 500,
+    'height': 200,
+    'background_color': render.STREAMLIT_BG,
+    'colormap': "Set3",
+    'max_font_size': 120,
+}
+CLOUD_SCALE = 2
+
+# Word cloud layout runs off the script thread; one worker, the layout is CPU bound
+renderer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wordcloud")
+
 
 
 def setGap(level="subheading"):
@@ -38,61 +70,82 @@ def clean_text(text):
 
     if pd.isna(text) or text == '':
         return ''
-    
-    # Convert to lowercase
-    text = str(text).lower()
-    
-    # Remove URLs
-    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-    
-    # Remove email addresses
-    text = re.sub(r'\S+@\S+', '', text)
-    
-    # Remove phone numbers
-    # Matches: 1234567890, 123-456-7890, 123.456.7890, (123) 456-7890, +91 1234567890, etc.
-    text = re.sub(r'[\+]?[\d\s\-\.\(\)]{10,15}', '', text)
-    
-    # Remove any remaining standalone 10+ digit numbers
-    text = re.sub(r'\b\d{10,}\b', '', text)
-    
-    # Remove special characters and numbers, keep only letters and spaces
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    
+
+    # One pass removes URLs, e-mail addresses and everything but letters and whitespace
+    text = CLEAN_PATTERN.sub('', str(text).lower())
+
     # Remove extra whitespaces
-    text = ' '.join(text.split())
-    
-    return text
+    return ' '.join(text.split())
 
 
 
-def get_top_words(text_data, top_n=50, min_length=2):
+def get_top_words(text_data, top_n=50, min_length=MIN_WORD_LENGTH):
     """ Extract top N words from text data """
 
-    # Combine all text
-    all_text = ' '.join(text_data.dropna().astype(str))
-    
-    # Clean the text
-    cleaned_text = clean_text(all_text)
-    
-    if not cleaned_text:
-        return {}
-    
-    # Split into words and filter
-    words = cleaned_text.split()
-    words = [word for word in words if len(word) >= min_length and word not in STOP_WORDS]
-    
-    # Count words and get top N
-    word_counts = Counter(words)
-    top_words = dict(word_counts.most_common(top_n))
-    
-    return top_words
+    word_counts = Counter()
+    texts = text_data.dropna().astype(str).tolist()
+
+    # Messages are cleaned a batch at a time and their words streamed into the counter,
+    # the whole history is never one string
+    for start in range(0, len(texts), CLEAN_BATCH):
+        batch = "\n".join(texts[start:start + CLEAN_BATCH]).lower()
+        word_counts.update(CLEAN_PATTERN.sub('', batch).split())
+
+    # Filter the distinct words rather than every occurrence
+    for word in [word for word in word_counts if len(word) < min_length or word in STOP_WORDS]:
+        del word_counts[word]
+
+    return dict(word_counts.most_common(top_n))
+
+
+
+def vocabulary_for(df):
+    """ TermMatrix of the chat's word-cloud words per user, built once per chat from the token index """
+
+    def build(df):
+        def term(token):
+            # clean_text per vocabulary token; None drops it from the matrix
+            word = clean_text(token)
+            return word if len(word) >= MIN_WORD_LENGTH and word not in STOP_WORDS else None
+
+        index = chat_stats.tokens_for(df)
+        term_ids, terms = index.map_vocabulary(term)
+        codes, users = pd.factorize(df['user'].astype(str).values)
+        people = [user != chat_stats.NOTIFICATION_USER for user in users]
+
+        return tokens.TermMatrix.from_tokens(index, codes, users, term_ids, terms, overall=people)
+
+    return chat_stats.derived(df, 'vocabulary', build)
+
+
+
+def user_word_freq(df, selected_user="Overall", top_n=50):
+    """ Top N words of a user (or "Overall") from the chat's vocabulary index, no text is rescanned """
+
+    return vocabulary_for(df).top_terms(selected_user, top_n)
+
+
+
+def distinctive_words(df, selected_user, top_n=10):
+    """ Words a user says far more than the rest of the group (TF-IDF), as a ranked table """
+
+    scores = vocabulary_for(df).distinctive_terms(selected_user, top_n)
+
+    return pd.DataFrame({'Word': list(scores), 'Score': np.round(list(scores.values()), 4)})
+
+
+
+def vocabulary_overlap(df, user_a, user_b):
+    """ Words shared by two users and exclusive to each, with the Jaccard index of their vocabularies """
+
+    return vocabulary_for(df).overlap(user_a, user_b)
 
 
 
 def generate_wordcloud(df, selected_user="Overall", message_column='message', top_n=50, width=800, height=400, background_color='black', colormap='viridis', max_font_size=100):
-    """ Generate a word cloud from message data """
+    """ Generate a word cloud image (PNG bytes) from message data """
  
-    df_copy = df.copy()
+    df_copy = df
     
     # Filter by user if not "Overall"
     if selected_user != "Overall":
@@ -126,7 +179,10 @@ def generate_wordcloud(df, selected_user="Overall", message_column='message', to
     
     # Get top words
     print(f"Processing {len(df_copy)} messages...")
-    word_freq = get_top_words(df_copy[message_column], top_n=top_n)
+    if message_column == 'message' and 'user' in df.columns:
+        word_freq = user_word_freq(df, selected_user, top_n=top_n)
+    else:
+        word_freq = get_top_words(df_copy[message_column], top_n=top_n)
     
     if not word_freq:
         print("No words found after filtering")
@@ -134,7 +190,7 @@ def generate_wordcloud(df, selected_user="Overall", message_column='message', to
     
     print(f"Top 10 words: {dict(list(word_freq.items())[:10])}")
     
-    # Create word cloud
+    # Lay out the word cloud and keep it as PNG bytes, a fraction of the raw RGB array
     try:
         wordcloud = WordCloud(
             width=width,
@@ -145,28 +201,15 @@ def generate_wordcloud(df, selected_user="Overall", message_column='message', to
             relative_scaling=0.5,
             random_state=42,
             collocations=False,  # Avoid pairing words
-            max_words=top_n
+            max_words=top_n,
+            scale=CLOUD_SCALE
         ).generate_from_frequencies(word_freq)
-        
-        # Create matplotlib figure
-        fig, ax = plt.subplots(figsize=(width/100, height/100))
-        ax.imshow(wordcloud, interpolation='bilinear')
-        ax.axis('off')
-        
-        # Set title
-        # title = f"Word Cloud - Top {top_n} Words"
-        # if selected_user != "Overall":
-        #    title += f" ({selected_user})"
-        # else:
-        #    title += " (Overall)"
-            
-        # fig.suptitle(title, fontsize=16, color='white', y=0.95)
-        fig.patch.set_facecolor('none')
-        
-        plt.tight_layout()
 
-        return fig
-        
+        buffer = io.BytesIO()
+        wordcloud.to_image().save(buffer, "PNG")
+
+        return buffer.getvalue()
+
     except Exception as e:
         print(f"Error generating word cloud: {e}")
 
@@ -174,10 +217,48 @@ def generate_wordcloud(df, selected_user="Overall", message_column='message', to
 
 
 
+def cloud_key(selected_user, params):
+    return ('wordcloud', selected_user, tuple(sorted(params.items())))
+
+
+
+def wordcloud_future(df, selected_user="Overall", **params):
+    """
+    Future of the word cloud image of a user, rendered once per chat, user and parameters
+    (top_n, size, colormap, ...) on the background renderer
+    """
+
+    return chat_stats.derived(df, cloud_key(selected_user, params), lambda df: renderer.submit(generate_wordcloud, df, selected_user, **params))
+
+
+
+def wordcloud_image(df, selected_user="Overall", **params):
+    """ Word cloud image of a user as PNG bytes, or None when there are no words """
+
+    future = wordcloud_future(df, selected_user, **params)
+
+    # Still queued behind other users' clouds: render it here rather than wait for them
+    if future.cancel():
+        future = Future()
+        future.set_result(generate_wordcloud(df, selected_user, **params))
+        chat_stats.remember(df, cloud_key(selected_user, params), future)
+
+    return future.result()
+
+
+
+def precompute_wordclouds(df, users):
+    """ Queue the page's word clouds of every user, so that switching users finds them rendered """
+
+    for user in users:
+        wordcloud_future(df, user, **CLOUD_PARAMS)
+
+
+
 def get_word_freq_table(df, selected_user="Overall", message_column='message', top_n=50):
     """ Get a frequency table of top words """
 
-    df_copy = df.copy()
+    df_copy = df
     
     user_columns = ['user', 'name', 'sender', 'from']
     user_col = None
@@ -201,7 +282,10 @@ def get_word_freq_table(df, selected_user="Overall", message_column='message', t
             message_column = available_cols[0]
     
     # Get word frequencies
-    word_freq = get_top_words(df_copy[message_column], top_n=top_n)
+    if message_column == 'message' and user_col == 'user':
+        word_freq = user_word_freq(df, selected_user, top_n=top_n)
+    else:
+        word_freq = get_top_words(df_copy[message_column], top_n=top_n)
     
     if not word_freq:
         return pd.DataFrame()
@@ -221,28 +305,18 @@ def plot_wordCloud(df, selected_user="Overall", message_column='message'):
     st.subheader("WordCloud")
     setGap()
     
-    # Fixed parameters
-    top_n = 100
-    colormap = "Set3"
-    width = 500
-    height = 200
-    max_font_size = 120
-    bg_color = STREAMLIT_BG
-
-    # Generate word cloud
-    fig = generate_wordcloud(
-        df,
-        selected_user=selected_user,
-        message_column=message_column,
-        top_n=top_n,
-        width=width,
-        height=height,
-        background_color=bg_color,
-        colormap=colormap,
-        max_font_size=max_font_size
-    )
-
-    if fig:
-        st.pyplot(fig, use_container_width=True)
+    if message_column == 'message':
+        image = wordcloud_image(df, selected_user, **CLOUD_PARAMS)
+    else:
+        image = generate_wordcloud(df, selected_user, message_column=message_column, **CLOUD_PARAMS)
+
+    if image is not None:
+        render.show(image)
     else:
         st.error("Could not generate word cloud. Check your data format.")
+
+    if selected_user != "Overall" and message_column == 'message':
+        distinctive = distinctive_words(df, selected_user)
+        if not distinctive.empty:
+            st.markdown("##### Distinctive Words")
+            st.dataframe(distinctive, hide_index=True)
@@ -0,0 +1,309 @@
+"""
+Benchmark for preprocessor.preprocess on a synthetic WhatsApp export.
+
+Run from the src directory:
+
+    python benchmarks/bench_preprocess.py --lines 1000000
+
+The per-line reference parser below is the implementation preprocess used
+before timestamps were parsed column-wise. It is kept here only to check
+that both produce the same DataFrame and to measure the speedup.
+"""
+
+import argparse
+import io
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import preprocessor
+
+
+USERS = ["Alice", "Bob", "Charlie", "Dev", "Esha", "Farhan", "Gita", "Hugo"]
+WORDS = ["hello", "how", "are", "you", "see", "you", "tomorrow", "lunch", "meeting",
+         "done", "thanks", "sure", "what", "time", "okay", "nice", "photo", "call"]
+
+
+def synthetic_export(n_lines, platform="android", seed=0, multiline_every=0):
+    """ Build a chat export with n_lines messages in the given platform's layout """
+
+    rng = random.Random(seed)
+    start = pd.Timestamp("2019-01-01 08:00")
+    lines = []
+
+    for i in range(n_lines):
+        ts = start + pd.Timedelta(minutes=i * 3 + rng.randint(0, 2))
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+
+        if i % 500 == 0:
+            body = f"{rng.choice(USERS)} added {rng.choice(USERS)}"
+        else:
+            body = f"{rng.choice(USERS)}: {words}"
+
+        if multiline_every and i % multiline_every == 1:
+            body += "\n" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+
+        if platform == "ios":
+            stamp = ts.strftime("%d/%m/%y, %I:%M:%S\u202f%p")
+            lines.append(f"[{stamp}] {body}")
+        else:
+            stamp = ts.strftime("%d/%m/%Y, %H:%M")
+            lines.append(f"{stamp} - {body}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reference_system_messages(df):
+    """ Full-column notification regex the per-line parser ran after building the frame """
+
+    system_message_patterns = [
+        r"Messages and calls are end-to-end encrypted",
+        r"changed the subject",
+        r"added",
+        r"left",
+        r"removed",
+        r"changed this group's icon",
+        r"joined using this group's invite link",
+        r"deleted this message",
+        r"created group",
+        r"video call",
+        r"Missed voice call",
+        r"Missed video call",
+        r"this message was deleted",
+        r"changed the group description",
+        r"Everyone is requested to reach the venue atlea",
+        r"Please join this group",
+        r"https://chat\.whatsapp\.com/",
+        r"You were added",
+        r"security code changed",
+        r"now an admin",
+        r"no longer an admin"
+    ]
+
+    system_regex = re.compile("|".join(system_message_patterns), re.IGNORECASE)
+
+    system_message_mask = df['message'].str.contains(system_regex, na=False)
+
+    df.loc[system_message_mask, 'user'] = "group_notification"
+    return df
+
+
+def reference_preprocess(data):
+    """ Per-line parser: one pd.to_datetime call per date and per time format """
+
+    pattern = r"""
+        (?:
+            \[?
+            (?P<date>\d{1,2}/\d{1,2}/\d{2,4}),\s*
+            (?P<time>\d{1,2}:\d{2}(?::\d{2})?\s*[APMapm\.]*)
+            \]?
+            (?:\s*[\-\]]\s*)
+            (?P<chat>.+)
+        )
+    """
+
+    users, messages, dates, times = [], [], [], []
+
+    for match in re.finditer(pattern, data, re.VERBOSE):
+        date = match.group("date")
+        time_str = match.group("time").replace('\u202f', ' ').strip()
+        chat = match.group("chat").strip()
+
+        date_obj = pd.to_datetime(date.strip(), dayfirst=True, errors='coerce')
+        if pd.isna(date_obj):
+            continue
+
+        if re.search(r'[APMapm]', time_str):
+            time_obj = pd.to_datetime(time_str, format='%I:%M:%S %p', errors='coerce')
+            if pd.isna(time_obj):
+                time_obj = pd.to_datetime(time_str, format='%I:%M %p', errors='coerce')
+        else:
+            time_obj = pd.to_datetime(time_str, format='%H:%M:%S', errors='coerce')
+            if pd.isna(time_obj):
+                time_obj = pd.to_datetime(time_str, format='%H:%M', errors='coerce')
+
+        if pd.isna(time_obj):
+            continue
+
+        if ':' in chat:
+            user, message = chat.split(':', 1)
+            user = user.strip()
+            if user.lower() == "meta ai":
+                continue
+            users.append(user)
+            messages.append(message.strip())
+        else:
+            users.append("group_notification")
+            messages.append(chat.strip())
+
+        dates.append(date_obj)
+        times.append(time_obj.time())
+
+    df = pd.DataFrame({'user': users, 'message': messages, 'date': dates, 'time': times})
+    df['year'] = df['date'].dt.year
+    df['month'] = df['date'].dt.month_name()
+    df['day'] = df['date'].dt.day.astype(str).str.zfill(2)
+    df['hour'] = pd.to_datetime(df['time'].astype(str), format='%H:%M:%S').dt.hour.astype(str).str.zfill(2)
+    df['minute'] = pd.to_datetime(df['time'].astype(str), format='%H:%M:%S').dt.minute.astype(str).str.zfill(2)
+
+    return reference_system_messages(df)
+
+
+# Notifications with a colon in their text, each with the authored message that follows it
+NOTIFICATION_CASES = {
+    "android subject": '12/01/2023, 10:01 - Alice changed the subject from "Trip" to "Trip: Goa"\n'
+                       '12/01/2023, 10:02 - Bob: nice\n',
+    "ios group name": '[12/01/2023, 10:01:00] Trip: Alice added Bob\n'
+                      '[12/01/2023, 10:02:00] Bob: nice\n',
+}
+
+
+def check_notifications():
+    """ Notifications whose text holds a colon must not be split into a made-up user """
+
+    for case, data in NOTIFICATION_CASES.items():
+        df = preprocessor.preprocess(data)
+        assert df['user'].tolist() == ["group_notification", "Bob"], (case, df['user'].tolist())
+        assert df['event_type'].tolist()[0] != "message", (case, df['event_type'].tolist())
+
+
+def single_line_split(text, dialect):
+    """ Extraction used before multi-line support: one findall match per line, continuations dropped """
+
+    header = preprocessor.header_pattern(dialect)
+    matches = re.findall(header.pattern + r"(.+)", text, header.flags)
+    if not matches:
+        return [], [], []
+
+    return zip(*matches)
+
+
+def multiline_report(data):
+    split_messages = preprocessor.split_messages
+
+    multi, multi_s = timed(preprocessor.preprocess, data)
+    preprocessor.split_messages = single_line_split
+    try:
+        single, single_s = timed(preprocessor.preprocess, data)
+    finally:
+        preprocessor.split_messages = split_messages
+
+    print(f"multi-line split:        {multi_s:8.2f} s for {len(multi):,} rows")
+    print(f"single-line findall:     {single_s:8.2f} s for {len(single):,} rows")
+    print(f"relative throughput:     {single_s / multi_s:8.2f}x")
+
+
+def parallel_report(data, workers):
+    serial, serial_s = timed(preprocessor.preprocess, data)
+    parallel, parallel_s = timed(preprocessor.preprocess, data, None, workers, 0)
+    pd.testing.assert_frame_equal(serial, parallel)
+    streamed_parallel, streamed_s = timed(preprocessor.preprocess_stream, io.BytesIO(data.encode("utf-8")),
+                                          preprocessor.CHUNK_SIZE, None, workers, 0)
+    pd.testing.assert_frame_equal(serial, streamed_parallel)
+
+    print(f"output identical on:     {len(serial):,} rows")
+    print(f"serial:                  {serial_s:8.2f} s")
+    print(f"{workers} workers:               {parallel_s:8.2f} s")
+    print(f"speedup:                 {serial_s / parallel_s:8.1f}x")
+    print(f"{workers} workers, streamed:     {streamed_s:8.2f} s")
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_memory(func, *args):
+    """ Peak Python heap allocated while func runs, and the size of its result """
+
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return peak, result.memory_usage(deep=True).sum()
+
+
+def whole_file(raw_bytes):
+    return preprocessor.preprocess(raw_bytes.decode("utf-8"))
+
+
+def streamed(raw_bytes):
+    return preprocessor.preprocess_stream(io.BytesIO(raw_bytes))
+
+
+def memory_report(data):
+    raw_bytes = data.encode("utf-8")
+    mb = 1024 * 1024
+
+    print(f"raw export:              {len(raw_bytes) / mb:8.1f} MB")
+    for label, func in (("decode + preprocess", whole_file), ("preprocess_stream", streamed)):
+        peak, frame = peak_memory(func, raw_bytes)
+        print(f"{label + ':':<24} {peak / mb:8.1f} MB peak, {peak / frame:.1f}x the DataFrame ({frame / mb:.1f} MB)")
+
+    compact = preprocessor.preprocess(data)
+    compact_mb = compact.memory_usage(deep=True).sum() / mb
+    legacy_mb = preprocessor.legacy_schema(compact).memory_usage(deep=True).sum() / mb
+    print(f"compact schema:          {compact_mb:8.1f} MB")
+    print(f"legacy schema:           {legacy_mb:8.1f} MB ({legacy_mb / compact_mb:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000, help="messages in the synthetic export")
+    parser.add_argument("--reference-lines", type=int, default=50_000,
+                        help="messages used to time the per-line reference parser (it is slow)")
+    parser.add_argument("--platform", choices=["android", "ios"], default="android")
+    parser.add_argument("--memory", action="store_true",
+                        help="compare peak memory of whole-file and streamed parsing instead")
+    parser.add_argument("--multiline", action="store_true",
+                        help="compare the multi-line split against the single-line findall path instead")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="compare serial parsing against a process pool of this many workers instead")
+    args = parser.parse_args()
+
+    check_notifications()
+
+    # Every tenth message gets a continuation line in the multi-line comparison
+    data = synthetic_export(args.lines, args.platform, multiline_every=10 if args.multiline else 0)
+
+    if args.memory:
+        memory_report(data)
+        return
+
+    if args.multiline:
+        multiline_report(data)
+        return
+
+    if args.workers:
+        parallel_report(data, args.workers)
+        return
+
+    sample = synthetic_export(args.reference_lines, args.platform)
+
+    fast_sample, fast_sample_s = timed(preprocessor.preprocess, sample)
+    ref_sample, ref_sample_s = timed(reference_preprocess, sample)
+    pd.testing.assert_frame_equal(preprocessor.legacy_schema(fast_sample), ref_sample)
+
+    fast, fast_s = timed(preprocessor.preprocess, data)
+
+    # Extrapolate the reference parser, it is linear in the number of lines
+    ref_s = ref_sample_s * args.lines / args.reference_lines
+
+    print(f"platform:                {args.platform}")
+    print(f"output identical on:     {len(fast_sample):,} rows")
+    print(f"preprocess:              {fast_s:8.2f} s for {len(fast):,} rows")
+    print(f"per-line reference:      {ref_s:8.2f} s (extrapolated from {args.reference_lines:,} rows)")
+    print(f"speedup:                 {ref_s / fast_s:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()